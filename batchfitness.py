@@ -0,0 +1,63 @@
+import math
+import numpy as np
+
+def random_grids(rng, count, size, blocked=0.3):
+	"""
+	count random size x size grids as a (count, size, size) boolean array, True is blocked
+	rng: a numpy Generator, each cell is blocked with probability blocked
+	"""
+	return rng.random((count, size, size)) < blocked
+
+def evaluate_batch(grids, route):
+	"""
+	The fitness of many grids at once, the same number Individual.calculate_fitness gives.
+	grids: (K, width, height) boolean array, True is blocked, grids[k, x, y] is the cell (x, y)
+	route: the (x, y) points the path has to visit in order
+	Every segment of every grid is searched at the same time: a breadth first search where a
+	whole frontier moves one step per iteration by shifting it in the four directions and masking
+	it with the free cells. Grids drop out of the batch as soon as one of their segments turns out
+	to be unreachable.
+	Returns (fitness, valid): a float array with the summed segment path lengths (inf for invalid
+	grids) and a boolean array.
+	"""
+	grids = np.asarray(grids, dtype=bool)
+	count = len(grids)
+	segments = len(route) - 1
+	free = ~grids
+	valid = np.ones(count, dtype=bool)
+	for x, y in route:
+		valid &= free[:, x, y]
+	fitness = np.zeros(count)
+	# the searches still running, one per (grid, segment)
+	grid_of = np.repeat(np.flatnonzero(valid), segments)
+	segment_of = np.tile(np.arange(segments), len(grid_of) // segments)
+	starts = np.array(route[:-1])[segment_of]
+	goals = np.array(route[1:])[segment_of]
+	n = len(grid_of)
+	open_cells = free[grid_of]
+	frontier = np.zeros_like(open_cells)
+	frontier[np.arange(n), starts[:, 0], starts[:, 1]] = True
+	open_cells[np.arange(n), starts[:, 0], starts[:, 1]] = False
+	steps = 0
+	while n:
+		steps += 1
+		following = np.zeros_like(frontier)
+		following[:, 1:, :] |= frontier[:, :-1, :]
+		following[:, :-1, :] |= frontier[:, 1:, :]
+		following[:, :, 1:] |= frontier[:, :, :-1]
+		following[:, :, :-1] |= frontier[:, :, 1:]
+		following &= open_cells
+		open_cells &= ~following
+		arrived = following[np.arange(n), goals[:, 0], goals[:, 1]]
+		# a path of steps moves has steps + 1 cells
+		np.add.at(fitness, grid_of[arrived], steps + 1)
+		stuck = ~arrived & ~following.reshape(n, -1).any(axis=1)
+		valid[grid_of[stuck]] = False
+		keep = ~arrived & valid[grid_of]
+		if not keep.all():
+			grid_of, goals = grid_of[keep], goals[keep]
+			open_cells, following = open_cells[keep], following[keep]
+			n = len(grid_of)
+		frontier = following
+	fitness[~valid] = math.inf
+	return fitness, valid
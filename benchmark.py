@@ -0,0 +1,220 @@
+# headless benchmarks of the pathfinding, the fitness evaluation, the GA and the simulation.
+# Every run uses the same seeds and mazes, so the JSON results of two runs can be compared:
+#   python benchmark.py --out before.json
+#   python benchmark.py --out after.json
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import platform
+import tracemalloc
+from grid import Grid
+from pathfinding import A_star, GridAStar
+import simulation
+import replay
+from geneticAlgo import Individual, Population, FitnessCache
+logger = logging.getLogger('pyGemTD')
+
+SEED = 1234
+size = simulation.width // simulation.tile_multiplier
+route = [(0, 5), (5, 5), (5, 19), (33, 19), (33, 5), (19, 5), (19, 33), (39, 32)]
+
+def readme_grid():
+	"""
+	the hand built maze of the README, the one with path length 2125
+	"""
+	with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'README.md')) as f:
+		text = f.read()
+	rows = json.loads(re.search(r'\[\[.*\]\]', text).group(0).replace('inf', '1'))
+	return Grid.from_rows(rows)
+
+def random_grid(seed, blocked=0.3):
+	"""
+	a grid with about blocked of its cells blocked, the route points are kept free
+	"""
+	rnd = random.Random(seed)
+	grid = Grid(size, size, bytes(1 if rnd.random() < blocked else 0 for c in range(size * size)))
+	for p in route:
+		grid.clear(p)
+	return grid
+
+def fixtures():
+	return {
+		'readme': readme_grid(),
+		'empty': Grid(size, size),
+		'random30': random_grid(SEED),
+		}
+
+def measure(fn, repeat, setup=None):
+	"""
+	calls fn repeat times and returns ops/sec, p50/p99 latency in ms and the peak memory in KiB
+	allocated during one extra call. setup runs untimed before every call, its result is passed on
+	"""
+	times = []
+	for r in range(repeat):
+		arg = setup() if setup else None
+		t = time.perf_counter()
+		fn(arg)
+		times.append(time.perf_counter() - t)
+	arg = setup() if setup else None
+	# tracing slows everything down, so the peak is taken in its own call
+	tracemalloc.start()
+	fn(arg)
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	times.sort()
+	total = sum(times)
+	return {
+		'repeat': repeat,
+		'ops_per_sec': repeat / total if total else math.inf,
+		'p50_ms': times[len(times) // 2] * 1000,
+		'p99_ms': times[min(len(times) - 1, int(len(times) * 0.99))] * 1000,
+		'peak_kib': peak / 1024,
+		}
+
+def game_on(grid):
+	game = simulation.Game()
+	for c, v in enumerate(grid.cells):
+		game.board.set(c, v)
+	return game
+
+def bench_a_star(grid, repeat):
+	# the longest segment of the route, with the heuristic and neighbors the game used to pass
+	start, goal = route[2], route[3]
+	h = lambda p: simulation.cartesian_distance(p, goal)
+	d = lambda a, b: 1
+	ne = lambda p: [grid.position(n) for n in grid.free_neighbors(grid.index(p))]
+	return measure(lambda a: A_star(start, goal, h, d, ne), repeat)
+
+def bench_grid_search(mode):
+	# every segment of the route searched with one GridAStar mode, the result also holds the
+	# number of cells the mode expanded for the whole route
+	def bench(grid, repeat):
+		search = GridAStar(grid.width, grid.height)
+		points = [grid.index(p) for p in route]
+		def run(a):
+			search.route(points, grid.cells, mode)
+			return search.expanded
+		result = measure(run, repeat)
+		result['expanded'] = run(None)
+		return result
+	return bench
+
+def bench_make_path(grid, repeat):
+	game = game_on(grid)
+	return measure(lambda a: game.make_path(), repeat)
+
+def bench_is_valid_grid(grid, repeat):
+	game = game_on(grid)
+	return measure(lambda a: game.is_valid_grid(), repeat)
+
+def bench_calculate_fitness(grid, repeat):
+	# the cache is off, every call evaluates
+	def setup():
+		i = Individual()
+		i.grid = grid.copy()
+		return i
+	return measure(lambda i: i.calculate_fitness(), repeat, setup)
+
+def bench_block_cell(grid, repeat):
+	# blocking and clearing random free cells one at a time, as dragging in the game does
+	game = game_on(grid)
+	game.make_path()
+	rnd = random.Random(SEED)
+	free = [grid.position(c) for c, v in enumerate(grid.cells) if not v]
+	def block(pos):
+		if game.block_cell(pos)[0]:
+			game.clear_cell(pos)
+	return measure(block, repeat, lambda: rnd.choice(free))
+
+def bench_frame(grid, repeat):
+	# one tick of the simulation with a wave of creeps walking the route
+	game = game_on(grid)
+	if not game.is_valid_grid()[0]:
+		return None
+	game.make_path()
+	sim = simulation.Simulation(game)
+	def step(a):
+		if not game.current_waves:
+			game.launch_wave(simulation.Wave(50, lambda: simulation.Creep(100, 2, 'NORMAL'), 2))
+		sim.step()
+	return measure(step, repeat)
+
+def bench_evolve(repeat):
+	# a generation of a serial population, the same seed for every run
+	random.seed(SEED)
+	p = Population(seed=SEED)
+	p.initialize()
+	result = measure(lambda a: p.evolve(), repeat)
+	p.close()
+	return result
+
+def bench_replay(path, repeat):
+	# a recorded session played back headless as fast as possible
+	return measure(lambda a: replay.play(path), repeat)
+
+grid_benchmarks = {
+	'A_star': (bench_a_star, 50),
+	'GridAStar.a_star': (bench_grid_search('a_star'), 50),
+	'GridAStar.jump_point': (bench_grid_search('jump_point'), 50),
+	'GridAStar.bidirectional': (bench_grid_search('bidirectional'), 50),
+	'Game.make_path': (bench_make_path, 50),
+	'Game.is_valid_grid': (bench_is_valid_grid, 50),
+	'Game.block_cell': (bench_block_cell, 500),
+	'Individual.calculate_fitness': (bench_calculate_fitness, 50),
+	'Simulation.step': (bench_frame, 2000),
+	}
+
+def run(only=None, scale=1.0, recordings=()):
+	"""
+	runs the benchmarks whose name contains only (all by default), scale multiplies the repeats
+	recordings: replay files to play back as load traces
+	returns the results as a dict that can be dumped to JSON
+	"""
+	cache = Individual.cache
+	Individual.cache = FitnessCache(0)
+	results = {}
+	try:
+		for name, grid in fixtures().items():
+			for bench, (fn, repeat) in grid_benchmarks.items():
+				if only and only not in bench:
+					continue
+				result = fn(grid, max(1, int(repeat * scale)))
+				results[bench + '/' + name] = result
+				logger.info('%s/%s: %s', bench, name, result)
+		if not only or only in 'Population.evolve':
+			results['Population.evolve'] = bench_evolve(max(1, int(5 * scale)))
+			logger.info('Population.evolve: %s', results['Population.evolve'])
+		for path in recordings:
+			results['replay/' + path] = bench_replay(path, max(1, int(5 * scale)))
+			logger.info('replay/%s: %s', path, results['replay/' + path])
+	finally:
+		Individual.cache = cache
+	return {
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'seed': SEED,
+		'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		'results': results,
+		}
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='headless pyGemTD benchmarks')
+	parser.add_argument('--out', help='file to write the JSON results to, stdout by default')
+	parser.add_argument('--only', help='only run benchmarks whose name contains this')
+	parser.add_argument('--scale', type=float, default=1.0, help='multiplies the number of repeats')
+	parser.add_argument('--replay', action='append', default=[], help='a recorded session to play back, repeatable')
+	args = parser.parse_args()
+	logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stderr)
+	report = run(args.only, args.scale, args.replay)
+	if args.out:
+		with open(args.out, 'w') as f:
+			json.dump(report, f, indent=1)
+	else:
+		json.dump(report, sys.stdout, indent=1)
@@ -0,0 +1,175 @@
+import instrument
+
+class CutIndex(object):
+	"""
+	For every segment between consecutive route points on a Grid, the free cells that every
+	path of the segment has to pass (the articulation points between its two ends).
+	Blocking such a cell disconnects the segment, blocking any other free cell does not.
+
+	The cells of a segment are found with one depth first search from its start and built
+	lazily. Changes to the grid are reported with cell_changed. Blocking a cell can only add cut
+	cells, so known cuts stay true unless the block disconnects the segment. Clearing a cell can
+	only remove cut cells, so known non-cuts stay true unless the segment was disconnected.
+	A segment is only rebuilt when a question needs the part that may be outdated.
+	"""
+
+	def __init__(self, grid, route):
+		self.grid = grid
+		self.route = [grid.index(p) for p in route]
+		self.segments = len(self.route) - 1
+		self.all = (1 << self.segments) - 1
+		size = grid.width * grid.height
+		# bit s of cuts[c] is set when blocking c disconnects segment s
+		self.cuts = bytearray(size) if self.segments <= 8 else [0] * size
+		# segments that may miss cut cells (blocks since their build) and segments that
+		# may hold cut cells that are no longer cuts (clears since their build)
+		self.missing = self.all
+		self.stale = self.all
+		# segments found disconnected by their last build
+		self.broken = 0
+		# (cell, value after the change, missing and stale before the change, builds so far)
+		self.last_change = None
+		self.builds = 0
+
+	def invalidate(self):
+		"""
+		forget everything, for when the grid changed without cell_changed being called
+		"""
+		self.missing = self.stale = self.all
+		self.last_change = None
+
+	def copy(self, grid):
+		"""
+		the same index on grid, a copy of the grid it was built on
+		"""
+		other = CutIndex.__new__(CutIndex)
+		other.grid = grid
+		other.route = self.route
+		other.segments = self.segments
+		other.all = self.all
+		other.cuts = self.cuts[:]
+		other.missing = self.missing
+		other.stale = self.stale
+		other.broken = self.broken
+		other.last_change = self.last_change
+		other.builds = self.builds
+		return other
+
+	def cell_changed(self, pos):
+		c = self.grid.index(pos)
+		value = self.grid.cells[c]
+		last = self.last_change
+		if last and last[0] == c and last[1] != value and last[4] == self.builds:
+			# the last change was undone, what was known before it is true again. Not after a
+			# build though, the cut cells it found only hold for the changed grid
+			self.missing, self.stale = last[2], last[3]
+			self.last_change = None
+			return
+		self.last_change = (c, value, self.missing, self.stale, self.builds)
+		if value:
+			# blocking a cut cell disconnects its segments, they have no cut cells any more.
+			# Segments that may miss cut cells may have just been disconnected as well
+			self.stale |= self.cuts[c] | self.missing
+			self.missing = self.all
+		else:
+			# clearing a cell may connect a disconnected segment, which then has cut cells
+			self.missing |= self.broken
+			self.stale = self.all
+
+	def knows(self, pos, segments=None):
+		"""
+		True if blocks_route can answer for pos and the segments (a bitmask, all by default)
+		without building any of them
+		"""
+		if segments is None:
+			segments = self.all
+		cut = self.cuts[self.grid.index(pos)]
+		# a known cut is outdated by clears, a known non-cut by blocks
+		return not (cut & self.stale | ~cut & self.missing) & segments
+
+	def blocks_route(self, pos, segments=None):
+		"""
+		the bitmask of the segments that blocking the free cell at pos would disconnect
+		segments: only look at these segments, a bitmask defaulting to all of them
+		"""
+		c = self.grid.index(pos)
+		if segments is None:
+			segments = self.all
+		result = 0
+		for s in range(self.segments):
+			bit = 1 << s
+			if not segments & bit:
+				continue
+			cut = self.cuts[c] & bit
+			if (cut and self.stale & bit) or (not cut and self.missing & bit):
+				self.build(s)
+				cut = self.cuts[c] & bit
+			result |= cut
+		return result
+
+	def unreachable(self, mask):
+		"""
+		the position of the route point cut off first by a blocks_route result
+		"""
+		s = (mask & -mask).bit_length() - 1
+		return self.grid.position(self.route[s+1])
+
+	def build(self, s):
+		"""
+		finds the cut cells of segment s, with an iterative Tarjan articulation point search
+		"""
+		self.builds += 1
+		if instrument.enabled:
+			instrument.count('cut_builds')
+		bit = 1 << s
+		cuts = self.cuts
+		for c in range(len(cuts)):
+			cuts[c] &= ~bit
+		self.missing &= ~bit
+		self.stale &= ~bit
+		self.broken |= bit
+		a, b = self.route[s], self.route[s+1]
+		cells = self.grid.cells
+		if cells[a]:
+			# a blocked start is already disconnected, blocking anything does not change that
+			return
+		neighbors = self.grid.neighbors
+		size = len(cells)
+		disc = [0] * size
+		low = [0] * size
+		parent = [-1] * size
+		t = 1
+		disc[a] = low[a] = t
+		stack = [(a, iter(neighbors[a]))]
+		while stack:
+			v, it = stack[-1]
+			for w in it:
+				if cells[w]:
+					continue
+				if not disc[w]:
+					t += 1
+					disc[w] = low[w] = t
+					parent[w] = v
+					stack.append((w, iter(neighbors[w])))
+					break
+				elif w != parent[v] and disc[w] < low[v]:
+					low[v] = disc[w]
+			else:
+				stack.pop()
+				p = parent[v]
+				if p != -1 and low[v] < low[p]:
+					low[p] = low[v]
+		if not disc[b]:
+			# already disconnected, blocking anything does not change that
+			return
+		self.broken &= ~bit
+		# blocking either end cuts the segment
+		cuts[a] |= bit
+		cuts[b] |= bit
+		w = b
+		v = parent[b]
+		while v != -1 and v != a:
+			if low[w] >= disc[v]:
+				cuts[v] |= bit
+			w = v
+			v = parent[v]
@@ -0,0 +1,66 @@
+import instrument
+
+class FlowField(object):
+	"""
+	Breadth first distances from the free cells of a Grid to one target cell, together with
+	the neighbor to step on next to get closer. Every move costs 1, so following the steps
+	from any cell walks a shortest path, the same length A* would find.
+	Cells are indices as in the Grid, blocked cells have no distance.
+	until: stop as soon as this cell has its distance. The field then covers every cell that is
+	at most as far away, which includes every cell on the shortest path from until.
+	"""
+
+	def __init__(self, grid, target, until=None):
+		self.grid = grid
+		self.target = target
+		cells = grid.cells
+		neighbors = grid.neighbors
+		size = len(cells)
+		# distance[c] is the number of moves from c to the target, -1 if unknown/unreachable
+		self.distance = distance = [-1] * size
+		# step[c] is the neighbor of c one move closer to the target
+		self.step = step = [-1] * size
+		# the number of cells given a distance
+		self.reached = 0
+		if cells[target]:
+			return
+		distance[target] = 0
+		frontier = [target]
+		reached = 1
+		d = 0
+		while frontier:
+			if until is not None and distance[until] >= 0:
+				break
+			d += 1
+			following = []
+			for c in frontier:
+				for n in neighbors[c]:
+					if distance[n] < 0 and not cells[n]:
+						distance[n] = d
+						step[n] = c
+						following.append(n)
+			reached += len(following)
+			frontier = following
+		self.reached = reached
+		if instrument.enabled:
+			instrument.count('flow_fields')
+			instrument.count('flow_field_cells', reached)
+
+	def length(self, c):
+		"""
+		the number of cells on the shortest path from c to the target (both included), 0 if there is none
+		"""
+		return self.distance[c] + 1
+
+	def path(self, c):
+		"""
+		the shortest path from c to the target as a list of cell indices, False if there is none
+		"""
+		if self.distance[c] < 0:
+			return False
+		step = self.step
+		path = [c]
+		while c != self.target:
+			c = step[c]
+			path.append(c)
+		return path
@@ -1,109 +1,255 @@
-from pyGemTD import A_star, cartesian_distance, Game
+from pathfinding import SegmentPaths, GridAStar, open_route
+from grid import Grid
+from connectivity import CutIndex
+from batchfitness import evaluate_batch, random_grids
+import maze
+import instrument
 import math
+import os
+import json
+import time
+import struct
 import random
 import logging
-import pygame
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Pipe, Process
 #logging.basicConfig(level=logging.DEBUG, format='%(asctime)-15s %(funcName)s %(lineno)d %(message)s')
 logger = logging.getLogger('genetic')
 
+class FitnessCache(object):
+    # remembers the (fitness, is_valid) of evaluated grids by their Zobrist hash
+    # the least recently used entries are dropped beyond maxsize, 0 turns it off
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, grid):
+        entry = self.entries.get(grid.zobrist)
+        # the cells are compared as well, a hash collision must not return a wrong fitness
+        if entry is not None and entry[0] == grid.cells:
+            self.entries.move_to_end(grid.zobrist)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, grid, result):
+        if self.maxsize <= 0:
+            return
+        self.entries[grid.zobrist] = (bytes(grid.cells), result)
+        self.entries.move_to_end(grid.zobrist)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __repr__(self):
+        return 'FitnessCache(' + str(len(self.entries)) + '/' + str(self.maxsize) + ' entries, ' + \
+            str(self.hits) + ' hits, ' + str(self.misses) + ' misses, ' + str(self.evictions) + \
+            ' evictions, hit rate ' + str(round(self.hit_rate(), 3)) + ')'
+
+
 class Individual(object):
-    # an Individual is a gridm of zero/math.inf values
+    # an Individual is a grid of free/blocked cells
 
     grid_size = 40
     mutation_prob = 0.1
+    waypoints = [(0, 5), (5, 5), (5, 19), (33, 19), (33, 5), (19, 5), (19, 33), (39, 32)]
+    # shared by all individuals of a process, replace it to resize
+    cache = FitnessCache()
+    # the GridAStar of route_search
+    search = None
 
     def __init__(self):
-        self.grid = []
+        self.grid = Grid(Individual.grid_size, Individual.grid_size)
         self.fitness = 0
         self.is_valid = False
+        # the segment paths and cut cells of the last evaluated grid, let flip search
+        # only what changed
+        self.routes = None
+        self.cuts = None
+        # a cell changed since routes and cuts were updated, because its fitness came from the
+        # cache, and the (fitness, is_valid) before that change
+        self.pending = None
+        self.before = None
 
     def initialize(self):
-        for x in range(Individual.grid_size):
-            self.grid.append([0 for y in range(Individual.grid_size)])
-            
+        self.grid = Grid(Individual.grid_size, Individual.grid_size)
 
     def get_neighbor(self, c):
-        x,y = c
-        result = [(x+1,y), (x-1,y), (x, y+1), (x, y-1)]
-        result = [i for i in result if i[0] >= 0 and i[0]<len(self.grid)]
-        result = [i for i in result if i[1] >= 0 and i[1]<len(self.grid)]
-        result = [i for i in result if self.grid[i[0]][i[1]] == 0]
-        return result
+        grid = self.grid
+        return [grid.position(n) for n in grid.free_neighbors(grid.index(c))]
 
     def clone(self):
         clone = Individual()
-        clone.grid = self.grid[:]
+        clone.grid = self.grid.copy()
         clone.fitness = self.fitness
         clone.is_valid = self.is_valid
         return clone
 
     def calculate_fitness(self):
         # calculates not only the fitness but also sets the is_valid flag
-        path = [(0, 5), (5, 5), (5, 19), (33, 19), (33, 5), (19, 5), (19, 33), (39, 32)]
-        result = 0
-        for i in range(len(path) - 1):
-            search = A_star(
-                    path[i],
-                    path[i+1],
-                    lambda w: cartesian_distance((path[i][0], path[i][1]),(w[0], w[1])),
-                    lambda w1,w2: cartesian_distance((w1[0], w1[1]),(w2[0], w2[1])),
-                    lambda w: self.get_neighbor(w)
-                    )
-            if not search:
-                self.is_valid = False
-                self.fitness = math.inf
-                return
-            else:
-                result += len(search)
-        self.is_valid = True
-        self.fitness = result
+        # grids evaluated before are looked up. Otherwise the route is searched in one pass with
+        # the search buffers of the process, the paths flip updates are only built once it flips
+        self.routes = None
+        self.cuts = None
+        self.pending = None
+        if self.lookup():
+            return
+        if instrument.enabled:
+            instrument.count('fitness_searches')
+        points = [self.grid.index(p) for p in Individual.waypoints]
+        path, lengths, unreachable = Individual.route_search().route(points, self.grid.cells, 'bidirectional')
+        self.is_valid = unreachable is None
+        self.fitness = sum(lengths) if self.is_valid else math.inf
+        Individual.cache.put(self.grid, (self.fitness, self.is_valid))
+
+    def lookup(self):
+        # takes the fitness of a grid evaluated before from the cache, False if it is not there
+        cached = Individual.cache.get(self.grid)
+        if cached is None:
+            return False
+        if instrument.enabled:
+            instrument.count('fitness_cache_hits')
+        self.fitness, self.is_valid = cached
+        return True
+
+    @classmethod
+    def route_search(cls):
+        # one GridAStar for the grid size in use, its buffers are reused by every search
+        n = cls.grid_size
+        if cls.search is None or cls.search.width != n:
+            cls.search = GridAStar(n, n)
+        return cls.search
+
+    def evaluate(self):
+        # searches the whole grid and keeps the paths for incremental updates
+        if instrument.enabled:
+            instrument.count('fitness_evaluations')
+        self.routes = SegmentPaths(self.grid, Individual.waypoints)
+        self.cuts = CutIndex(self.grid, Individual.waypoints)
+        self.pending = None
+        self.read_fitness()
+
+    def update_fitness(self, pos):
+        # like calculate_fitness after only the cell at pos changed. A grid seen before takes
+        # its fitness from the cache and leaves updating the paths until they are needed, a
+        # flip that is undone right away then never searches. Undoing a change that was
+        # searched restores the paths from before it, no lookup is cheaper than that
+        if self.routes is None or self.routes.grid is not self.grid:
+            # nothing to update, the following flips are searched incrementally
+            self.routes = None
+            self.cuts = None
+            if not self.lookup():
+                self.evaluate()
+            return
+        if self.pending == pos:
+            # changed back, the paths are current again
+            self.fitness, self.is_valid = self.before
+            self.pending = None
+            return
+        if self.pending is not None:
+            # the paths can only follow one change at a time, flip applies the pending one first
+            self.evaluate()
+            return
+        undo = self.routes.undoes(pos)
+        cached = None if undo else Individual.cache.get(self.grid)
+        if cached is not None:
+            if instrument.enabled:
+                instrument.count('fitness_cache_hits')
+            self.before = (self.fitness, self.is_valid)
+            self.fitness, self.is_valid = cached
+            self.pending = pos
+            return
+        if instrument.enabled:
+            instrument.count('fitness_undos' if undo else 'fitness_updates')
+        self.routes.cell_changed(pos)
+        self.cuts.cell_changed(pos)
+        # the grid before the change is cached already
+        self.read_fitness(put=not undo)
+
+    def apply_pending(self):
+        # brings routes and cuts up to date with the grid, before it changes again
+        if self.pending is not None:
+            if instrument.enabled:
+                instrument.count('fitness_updates')
+            self.routes.cell_changed(self.pending)
+            self.cuts.cell_changed(self.pending)
+            self.pending = None
+
+    def would_block(self, pos):
+        # True if the cut index knows that blocking the free cell at pos makes the grid invalid.
+        # False when it would have to be rebuilt to tell, flip then finds out by blocking
+        if self.routes is None or self.routes.grid is not self.grid:
+            self.evaluate()
+        self.apply_pending()
+        segments = self.routes.segments_over(pos)
+        if not segments or not self.cuts.knows(pos, segments):
+            return False
+        return self.cuts.blocks_route(pos, segments) != 0
+
+    def read_fitness(self, put=True):
+        self.is_valid = self.routes.is_valid()
+        self.fitness = self.routes.length() if self.is_valid else math.inf
+        if put:
+            Individual.cache.put(self.grid, (self.fitness, self.is_valid))
 
     def get_random(self):
+        # 1 is a blocked cell, 0 a free one
         r = random.random()
         if r < 0.3:
-            return math.inf
+            return 1
         return 0
-        #return random.choice([0,0,math.inf])
+        #return random.choice([0,0,1])
 
     def randomize(self):
+        i = 0
         while not self.is_valid:
             i += 1
-            self.grid = []
-            for x in range(Individual.grid_size):
-                self.grid.append([self.get_random() for y in range(Individual.grid_size)])
+            cells = bytes(self.get_random() for c in range(Individual.grid_size ** 2))
+            self.grid = Grid(Individual.grid_size, Individual.grid_size, cells)
             self.calculate_fitness()
-        logger.debug('Randomized ' + str(self) + ' after ' + str(i) + ' tries.')
+        logger.debug('Randomized %s after %s tries.', self, i)
 
     def mutate(self):
-        for x,line in enumerate(self.grid):
-            for y,cell in enumerate(line):
-                if random.random() < Individual.mutation_prob:
-                    store = cell
-                    self.grid[x][y] = 0 if cell == math.inf else math.inf
-                    self.calculate_fitness()
-                    if not self.is_valid:
-                        self.grid[x][y] = store
-                        self.calculate_fitness()
+        grid = self.grid
+        for c in range(len(grid.cells)):
+            if random.random() < Individual.mutation_prob:
+                self.flip(*grid.position(c))
 
     def clone(self):
         clone = Individual()
-        clone.grid = self.grid[:]
+        clone.grid = self.grid.copy()
         clone.calculate_fitness()
         return clone
 
     def crossover(self, other):
         # strategy is to use as many blocks as possible without becoming invalid
+        # the child gets the blocks of both parents at once, repair opens what the route needs
+        n = Individual.grid_size
+        mine = np.frombuffer(self.grid.cells, dtype=np.uint8)
+        theirs = np.frombuffer(other.grid.cells, dtype=np.uint8)
         child = Individual()
-        child.initialize()
-        for x, line in enumerate(self.grid):
-            for y, cell in enumerate(line):
-                child.grid[x][y] = math.inf if (self.grid[x][y] == math.inf or other.grid[x][y] == math.inf) else 0
-                child.calculate_fitness()
-                if not child.is_valid:
-                    child.grid[x][y] = 0
-        child.calculate_fitness()
+        child.grid = Grid(n, n, (mine | theirs).tobytes())
+        child.repair()
         return child
 
+    def repair(self):
+        # clears the fewest cells that make the grid valid again and evaluates it, one search
+        # per segment instead of one evaluation per cell
+        cleared = open_route(self.grid, Individual.waypoints)
+        self.calculate_fitness()
+        return cleared
+
     def __repr__(self):
         return str(id(self)) + '@' + str(self.fitness)
 
@@ -119,33 +265,61 @@ class Individual(object):
             if self.fitness <= cf:
                 # it did not do anything, flip it back
                 self.flip(x,y)
-        logger.debug(str(self) + ' gradient flipped for ' + str(self.fitness - f))
+        logger.debug('%s gradient flipped for %s', self, self.fitness - f)
 
     def mutate(self, tries = 50):
         # same as gradient_flip but without the requirement to increase 
-        # the fitness
+        # the fitness. All tries cells are flipped at once, then the grid is repaired
         f = self.fitness
-        for t in range(tries):
-            cf = self.fitness
-            x = random.randrange(Individual.grid_size)
-            y = random.randrange(Individual.grid_size)
-            self.flip(x,y)
-        logger.debug(str(self) + ' mutated for ' + str(self.fitness - f))
+        n = Individual.grid_size
+        cells = np.frombuffer(self.grid.cells, dtype=np.uint8).copy()
+        flips = [random.randrange(n * n) for t in range(tries)]
+        # a cell drawn twice is flipped twice
+        np.bitwise_xor.at(cells, flips, 1)
+        self.grid = Grid(n, n, cells.tobytes())
+        self.repair()
+        logger.debug('%s mutated for %s', self, self.fitness - f)
 
     def flip(self, x, y):
-        old_fitness = self.fitness
-        self.grid[x][y] = 0 if self.grid[x][y] > 0 else math.inf
-        self.calculate_fitness()
+        if self.pending != (x, y):
+            self.apply_pending()
+        if not self.grid.is_blocked((x,y)) and self.would_block((x,y)):
+            # blocking would make it invalid, nothing changes
+            return
+        self.grid.flip((x,y))
+        self.update_fitness((x,y))
         if not self.is_valid:
-            # unlock the tile and reset the fitness
-            self.grid[x][y] = 0
-            self.fitness = old_fitness
+            # unlock the tile, which restores the previous paths and fitness
+            cut = [s for s, path in enumerate(self.routes.paths) if not path] if self.routes and self.pending is None else []
+            self.grid.clear((x,y))
+            self.update_fitness((x,y))
+            # the segments that were cut are built, so their other cut cells are known
+            for s in cut:
+                self.cuts.build(s)
+
+    def save(self, path):
+        # the grid and the waypoints in the compact maze format
+        maze.save(path, self.grid, Individual.waypoints)
+
+    @classmethod
+    def load(cls, path):
+        # an Individual with the grid of a saved maze, evaluated
+        grid, route = maze.load(path)
+        if route != Individual.waypoints:
+            raise ValueError(path + ' has another route than Individual.waypoints')
+        i = cls()
+        i.grid = grid
+        i.calculate_fitness()
+        return i
 
     def show_window(self):
+        # the only part needing a display, pygame is only loaded here
+        import pygame
+        from pyGemTD import Game
         display = pygame.display.set_mode((1000,1000))
         game = Game()
         for (x,y), tile in game.grid.items():
-            if self.grid[x][y] > 0:
+            if self.grid.is_blocked((x,y)):
                 tile.block()
         game.show_waypoints()
         game.make_path()
@@ -159,41 +333,101 @@ class Individual(object):
                 if event.type == pygame.QUIT:
                     terminated = True
 
+def run_task(task):
+    # applies one Individual operation to a grid, in a worker process or inline
+    # task is (operation name, grid cells as bytes or None, seed), the result is
+    # (grid cells as bytes, fitness, is_valid)
+    operation, cells, seed = task
+    state = random.getstate()
+    random.seed(seed)
+    i = Individual()
+    if cells is not None:
+        i.grid = Grid(Individual.grid_size, Individual.grid_size, cells)
+        i.calculate_fitness()
+    getattr(i, operation)()
+    random.setstate(state)
+    return bytes(i.grid.cells), i.fitness, i.is_valid
+
+
 class Population(object):
 
     size = 10
+    # the number of tasks evolve runs per generation
+    tasks = 6
 
-    def __init__(self):
+    def __init__(self, workers=0, seed=None):
         self.individuals = []
         self.generation = 1
+        # with workers > 0 the individuals are worked on in a process pool of that size, at
+        # most one worker per task of a generation, more would only wait
+        self.workers = min(workers, Population.tasks)
+        self.pool = None
+        # draws the seed of every task, so a run only depends on this seed and not on
+        # which worker did what
+        self.random = random.Random(seed)
 
-    def initialize(self):
-        logger.debug('Starting Population initialization')
-        for s in range(len(self.individuals),Population.size):
+    def run(self, tasks):
+        # runs (operation, individual or None) tasks and returns the resulting individuals in order
+        tasks = [(op, None if i is None else bytes(i.grid.cells), self.random.getrandbits(32)) for op, i in tasks]
+        if self.workers > 0:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            results = self.pool.map(run_task, tasks)
+        else:
+            results = map(run_task, tasks)
+        individuals = []
+        for cells, fitness, is_valid in results:
             i = Individual()
-            i.randomize()
-            self.individuals.append(i)
-        logger.debug('Finished Population initialization')
+            i.grid = Grid(Individual.grid_size, Individual.grid_size, cells)
+            i.fitness = fitness
+            i.is_valid = is_valid
+            individuals.append(i)
+        return individuals
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def initialize(self, batch=1000):
+        # screens batches of random grids all at once until there are enough valid ones, the
+        # same as Individual.randomize for every missing individual but without a search per grid
+        logger.debug('Starting Population initialization')
+        rng = np.random.default_rng(self.random.getrandbits(32))
+        n = Individual.grid_size
+        tries = 0
+        while len(self.individuals) < Population.size:
+            grids = random_grids(rng, batch, n)
+            fitness, valid = evaluate_batch(grids, Individual.waypoints)
+            tries += batch
+            for k in np.flatnonzero(valid)[:Population.size - len(self.individuals)]:
+                i = Individual()
+                i.grid = Grid(n, n, grids[k].tobytes())
+                i.fitness = int(fitness[k])
+                i.is_valid = True
+                self.individuals.append(i)
+        logger.debug('Finished Population initialization after %s random grids', tries)
         self.individuals.sort(key=lambda i: i.fitness, reverse=True)
 
     def evolve(self):
-        # advance to the next generation
+        # advance to the next generation, in Population.tasks tasks
         self.sort()
-        # two times clone the leader and gradient_flip it
         winner = self.individuals[0]
-        for pos in [-1,-2]:
-            clone = winner.clone()
-            clone.gradient_flip()
-            self.individuals[pos] = clone
-        # mutate a clone of the winner
-        clone = winner.clone()
-        clone.mutate()
-        self.individuals[-3] = clone
-        # gradient_flip the second
-        self.individuals[1].gradient_flip()
-        # mutate the third and fourth
-        self.individuals[2].mutate()
-        self.individuals[3].mutate()
+        tasks = [
+            # two times clone the leader and gradient_flip it
+            (-1, 'gradient_flip', winner),
+            (-2, 'gradient_flip', winner),
+            # mutate a clone of the winner
+            (-3, 'mutate', winner),
+            # gradient_flip the second
+            (1, 'gradient_flip', self.individuals[1]),
+            # mutate the third and fourth
+            (2, 'mutate', self.individuals[2]),
+            (3, 'mutate', self.individuals[3]),
+            ]
+        results = self.run([(op, i) for pos, op, i in tasks])
+        for (pos, op, i), result in zip(tasks, results):
+            self.individuals[pos] = result
         self.sort()
         self.generation += 1
 
@@ -204,18 +438,230 @@ class Population(object):
 
     def repr_fitness(self):
         return str(self.individuals)
+
+    # checkpoint layout: magic, version, generation, grid size, number of individuals, the
+    # Mersenne Twister state of self.random (version, 625 words, gauss_next), then every
+    # individual as its packed grid, fitness and is_valid
+    checkpoint_magic = b'GTDP'
+    checkpoint_version = 1
+
+    def save(self, path):
+        # writes the state to path, through a temporary file so a crash never leaves half a checkpoint
+        n = Individual.grid_size
+        version, words, gauss = self.random.getstate()
+        data = [struct.pack('<4sHIHH', Population.checkpoint_magic, Population.checkpoint_version,
+            self.generation, n, len(self.individuals))]
+        data.append(struct.pack('<B625I?d', version, *words, gauss is not None, gauss or 0.0))
+        for i in self.individuals:
+            data.append(i.grid.pack())
+            data.append(struct.pack('<d?', i.fitness, i.is_valid))
+        with open(path + '.tmp', 'wb') as f:
+            f.write(b''.join(data))
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path, workers=0):
+        # a Population continuing exactly where the saved one stopped
+        with open(path, 'rb') as f:
+            data = f.read()
+        header = struct.calcsize('<4sHIHH')
+        magic, version, generation, n, count = struct.unpack_from('<4sHIHH', data)
+        if magic != Population.checkpoint_magic or version != Population.checkpoint_version:
+            raise ValueError(path + ' is not a version ' + str(Population.checkpoint_version) + ' checkpoint')
+        if n != Individual.grid_size:
+            raise ValueError(path + ' holds ' + str(n) + 'x' + str(n) + ' grids')
+        state = struct.unpack_from('<B625I?d', data, header)
+        offset = header + struct.calcsize('<B625I?d')
+        p = cls(workers=workers)
+        p.generation = generation
+        p.random.setstate((state[0], tuple(state[1:626]), state[627] if state[626] else None))
+        packed_size = (n * n + 7) // 8
+        for k in range(count):
+            i = Individual()
+            i.grid = Grid.unpack(n, n, data[offset:offset + packed_size])
+            offset += packed_size
+            fitness, i.is_valid = struct.unpack_from('<d?', data, offset)
+            offset += struct.calcsize('<d?')
+            i.fitness = int(fitness) if fitness != math.inf else fitness
+            p.individuals.append(i)
+        return p
+
+    def stats(self):
+        # a summary of the current generation, small and the same size every generation
+        # invalid individuals have an infinite fitness, they are only counted
+        valid = [i for i in self.individuals if i.is_valid]
+        fitness = [i.fitness for i in valid]
+        best = max(valid, key=lambda i: i.fitness) if valid else None
+        return {
+            'generation': self.generation,
+            'time': time.time(),
+            'best': best.fitness if best else None,
+            'mean': sum(fitness) / len(fitness) if fitness else None,
+            'worst': min(fitness) if fitness else None,
+            'valid': len(fitness),
+            'cache_hit_rate': Individual.cache.hit_rate(),
+            'best_grid': best.grid.pack().hex() if best else None,
+            }
+
+    def log(self, path):
+        # appends stats() as one JSON line to path
+        with open(path, 'a') as f:
+            f.write(json.dumps(self.stats()) + '\n')
+
+    def emigrants(self, count):
+        # the best count individuals as (packed grid, fitness) pairs
+        self.sort()
+        return [(i.grid.pack(), i.fitness) for i in self.individuals[:count]]
+
+    def immigrate(self, migrants):
+        # takes in (packed grid, fitness) pairs, the worst individuals make room for better ones
+        n = Individual.grid_size
+        for packed, fitness in migrants:
+            i = Individual()
+            i.grid = Grid.unpack(n, n, packed)
+            i.fitness = fitness
+            i.is_valid = fitness != math.inf
+            self.individuals.append(i)
+        self.sort()
+        del self.individuals[Population.size:]
+
+
+def run_island(connection, seed):
+    # the loop of one island process, a Population evolving on its own and answering
+    # ('evolve', generations, emigrant count) with its emigrants, ('migrate', migrants)
+    # and ('stop',) with the packed best grid and its fitness
+    p = Population(seed=seed)
+    random.seed(seed)
+    p.initialize()
+    while True:
+        message = connection.recv()
+        if message[0] == 'evolve':
+            for g in range(message[1]):
+                p.evolve()
+            connection.send(p.emigrants(message[2]))
+        elif message[0] == 'migrate':
+            p.immigrate(message[1])
+        else:
+            connection.send(p.emigrants(1)[0])
+            connection.close()
+            return
+
+
+class Islands(object):
+    # independent populations in processes of their own that exchange their best individuals
+    # every `every` generations. Each sends its best `migrants` individuals to its neighbor
+    # (topology 'ring') or to all other islands ('mesh'). Grids travel bit-packed.
+
+    topologies = ('ring', 'mesh')
+
+    def __init__(self, count=None, migrants=2, every=5, topology='ring', seed=None):
+        if topology not in Islands.topologies:
+            raise ValueError('unknown topology ' + str(topology))
+        if every < 1:
+            # run would never get past the first exchange
+            raise ValueError('islands exchange every ' + str(every) + ' generations, at least 1')
+        if migrants < 1:
+            raise ValueError('islands send ' + str(migrants) + ' migrants, at least 1')
+        self.count = count or os.cpu_count()
+        self.migrants = migrants
+        self.every = every
+        self.topology = topology
+        self.random = random.Random(seed)
+        self.generation = 1
+        self.connections = []
+        self.processes = []
+        # the best (packed grid, fitness) of every island after the last exchange
+        self.leaders = []
+
+    def start(self):
+        for k in range(self.count):
+            mine, theirs = Pipe()
+            process = Process(target=run_island, args=(theirs, self.random.getrandbits(32)), daemon=True)
+            process.start()
+            theirs.close()
+            self.connections.append(mine)
+            self.processes.append(process)
+
+    def destinations(self, k):
+        if self.topology == 'ring':
+            return [(k + 1) % self.count]
+        return [d for d in range(self.count) if d != k]
+
+    def run(self, generations):
+        # evolves every island for generations generations, with an exchange every `every`
+        if not self.processes:
+            self.start()
+        done = 0
+        while done < generations:
+            step = min(self.every, generations - done)
+            for c in self.connections:
+                c.send(('evolve', step, self.migrants))
+            emigrants = [c.recv() for c in self.connections]
+            done += step
+            self.generation += step
+            self.leaders = [e[0] for e in emigrants]
+            incoming = [[] for k in range(self.count)]
+            for k, migrants in enumerate(emigrants):
+                for d in self.destinations(k):
+                    incoming[d].extend(migrants)
+            for c, migrants in zip(self.connections, incoming):
+                c.send(('migrate', migrants))
+            logger.debug('Islands at generation %s, best fitness %s', self.generation,
+                [fitness for packed, fitness in self.leaders])
+        return self.best()
+
+    def best(self):
+        # the best Individual seen at the last exchange
+        n = Individual.grid_size
+        packed, fitness = max(self.leaders, key=lambda leader: leader[1])
+        i = Individual()
+        i.grid = Grid.unpack(n, n, packed)
+        i.fitness = fitness
+        i.is_valid = fitness != math.inf
+        return i
+
+    def close(self):
+        # the islands answer with their best, which may be a migrant taken in after the last exchange
+        for c in self.connections:
+            c.send(('stop',))
+        if self.connections:
+            self.leaders = [c.recv() for c in self.connections]
+        for c in self.connections:
+            c.close()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
                 
 
 if __name__ == '__main__':
-    i = Individual()
-    i.grid = [[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, 0, 0, 0, 0, math.inf, 0, 0, 0, 0, 0, math.inf, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, 0, 0, 0, math.inf, 0, 0, math.inf, math.inf, math.inf, 0, math.inf, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, math.inf, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, math.inf, 0, 0, math.inf, math.inf, math.inf, math.inf, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 0, 0, math.inf, 0, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, math.inf, math.inf, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, math.inf, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, math.inf, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, math.inf, math.inf, math.inf, math.inf, math.inf, 0, 0, 0, math.inf, 0, 0, math.inf, math.inf, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, math.inf, 0, 0, 0, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, math.inf, 0, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, 0, 0, math.inf, math.inf, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, math.inf, 0, math.inf, math.inf, 0, 0, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, math.inf, 0, 0, 0, math.inf, 0, 0, 0, 0, math.inf, math.inf, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, math.inf, 0, 0, 0, 0, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, 0, 0, 0, math.inf, 0, math.inf, 0, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, 0, 0, 0, math.inf, 0, math.inf, 0, math.inf, 0, 0, 0, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, math.inf, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, 0, 0, 0, math.inf, 0, math.inf, 0, math.inf, 0, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, math.inf, 0, math.inf, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, 0, 0, 0, math.inf, 0, math.inf, 0, math.inf, 0, math.inf, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, math.inf, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, 0, math.inf, math.inf, 0, 0, math.inf, 0, math.inf, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, math.inf, 0, 0, 0, math.inf, 0, 0, math.inf, 0, math.inf, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, math.inf, 0, math.inf, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, math.inf, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, math.inf, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, math.inf, 0, math.inf, 0, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, math.inf, 0, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, 0, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, math.inf, 0, 0, 0, 0, math.inf, 0, 0, math.inf, 0, math.inf, 0, 0, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, math.inf, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, math.inf, 0, 0, 0, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, math.inf, 0, 0, 0, 0, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, math.inf, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, math.inf, 0, 0, math.inf, 0, 0, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 0, math.inf, 0, math.inf, 0, math.inf, math.inf, math.inf, 0, 0, math.inf, 0, 0, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 0, math.inf, 0, math.inf, 0, 0, 0, 0, 0, 0, math.inf, 0, 0, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 0, math.inf, 0, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, 0, 0, 0, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 0, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, math.inf, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]]
-    i.calculate_fitness()
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)-15s %(funcName)s %(lineno)d %(message)s')
+    # the hand built maze of the README
+    i = Individual.load('readme.gtdm')
     #i.show_window()
-    p = Population()
-    p.initialize()
-    for g in range(5):
+    # an unfinished run is resumed from its checkpoint, every generation is checkpointed and logged
+    checkpoint = 'population.ckpt'
+    generation_log = 'generations.jsonl'
+    # every generation's winner is archived
+    library = maze.MazeLibrary('mazes.gtdl')
+    generations = 5
+    # a worker per task of a generation, as far as there are cores for them
+    workers = min(Population.tasks, os.cpu_count() or 1)
+    if os.path.exists(checkpoint):
+        p = Population.load(checkpoint, workers=workers)
+        logger.debug('Resuming at generation %s', p.generation)
+    else:
+        p = Population(workers=workers)
+        p.initialize()
+    while p.generation <= generations:
         p.evolve()
-        winner = p.individuals[0]
-        winner.show_window()
-        logger.debug(winner.grid)
+        p.save(checkpoint)
+        p.log(generation_log)
+        library.append(p.individuals[0].grid, Individual.waypoints)
         logger.debug(p.repr_fitness())
+        logger.debug(Individual.cache)
+    # the run is finished, the next one starts over instead of resuming at its end
+    os.remove(checkpoint)
+    p.close()
+    library.close()
+    p.individuals[0].show_window()
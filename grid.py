@@ -0,0 +1,157 @@
+import math
+import random
+
+_neighbor_tables = {}
+_zobrist_tables = {}
+
+def neighbor_table(width, height):
+	"""
+	returns a tuple holding, for every cell index, the tuple of its 4-connected neighbor indices
+	the order is left, right, up, down. Tables are built once per size and shared.
+	"""
+	key = (width, height)
+	table = _neighbor_tables.get(key)
+	if table is None:
+		table = []
+		for i in range(width * height):
+			x, y = divmod(i, height)
+			n = []
+			if x > 0:
+				n.append(i - height)
+			if x < width - 1:
+				n.append(i + height)
+			if y > 0:
+				n.append(i - 1)
+			if y < height - 1:
+				n.append(i + 1)
+			table.append(tuple(n))
+		table = tuple(table)
+		_neighbor_tables[key] = table
+	return table
+
+
+def zobrist_table(width, height):
+	"""
+	returns a tuple of one random 64 bit key per cell index, the Zobrist hash of a grid is the xor
+	of the keys of its blocked cells. The keys are seeded, so hashes are the same in every process.
+	"""
+	key = (width, height)
+	table = _zobrist_tables.get(key)
+	if table is None:
+		rnd = random.Random(width * 100003 + height)
+		table = tuple(rnd.getrandbits(64) for i in range(width * height))
+		_zobrist_tables[key] = table
+	return table
+
+
+class Grid(object):
+	"""
+	The blocked/free state of a map, one byte per cell.
+	A cell (x,y) lives at index x * height + y, so the layout matches grid[x][y] of the
+	nested lists used before. cells can be handed to the pathfinder directly as its
+	blocked lookup. Change cells only through set/block/clear/flip, they keep the Zobrist
+	hash of the grid current.
+	"""
+
+	__slots__ = ('width', 'height', 'cells', 'neighbors', 'keys', 'zobrist')
+
+	def __init__(self, width, height, cells=None):
+		self.width = width
+		self.height = height
+		self.cells = bytearray(width * height) if cells is None else bytearray(cells)
+		self.neighbors = neighbor_table(width, height)
+		self.keys = zobrist_table(width, height)
+		self.rehash()
+
+	def rehash(self):
+		keys = self.keys
+		h = 0
+		for i, c in enumerate(self.cells):
+			if c:
+				h ^= keys[i]
+		self.zobrist = h
+
+	@classmethod
+	def from_rows(cls, rows):
+		"""
+		builds a grid from the nested list format (grid[x][y], 0 is free, anything else blocked)
+		"""
+		return cls(len(rows), len(rows[0]), bytes(1 if cell else 0 for line in rows for cell in line))
+
+	def to_rows(self):
+		"""
+		the nested list format with math.inf for blocked cells, as dumped by the game
+		"""
+		h = self.height
+		return [[math.inf if c else 0 for c in self.cells[x*h:(x+1)*h]] for x in range(self.width)]
+
+	def pack(self):
+		"""
+		the cells as bits, 8 cells per byte with the first cell in the highest bit
+		"""
+		cells = self.cells
+		packed = bytearray((len(cells) + 7) // 8)
+		for i in range(len(cells)):
+			if cells[i]:
+				packed[i >> 3] |= 0x80 >> (i & 7)
+		return bytes(packed)
+
+	@classmethod
+	def unpack(cls, width, height, packed):
+		"""
+		the grid of a pack result
+		"""
+		return cls(width, height, bytes((packed[i >> 3] >> (7 - (i & 7))) & 1 for i in range(width * height)))
+
+	def index(self, pos):
+		return pos[0] * self.height + pos[1]
+
+	def position(self, i):
+		return divmod(i, self.height)
+
+	def is_blocked(self, pos):
+		return self.cells[pos[0] * self.height + pos[1]] == 1
+
+	def set(self, i, value):
+		if self.cells[i] != value:
+			self.cells[i] = value
+			self.zobrist ^= self.keys[i]
+
+	def block(self, pos):
+		self.set(pos[0] * self.height + pos[1], 1)
+
+	def clear(self, pos):
+		self.set(pos[0] * self.height + pos[1], 0)
+
+	def flip(self, pos):
+		i = pos[0] * self.height + pos[1]
+		self.cells[i] ^= 1
+		self.zobrist ^= self.keys[i]
+
+	def free_neighbors(self, i):
+		cells = self.cells
+		return [n for n in self.neighbors[i] if not cells[n]]
+
+	def blocked_count(self):
+		return self.cells.count(1)
+
+	def copy(self):
+		grid = Grid.__new__(Grid)
+		grid.width = self.width
+		grid.height = self.height
+		grid.cells = bytearray(self.cells)
+		grid.neighbors = self.neighbors
+		grid.keys = self.keys
+		grid.zobrist = self.zobrist
+		return grid
+
+	def __eq__(self, other):
+		return isinstance(other, Grid) and self.width == other.width and self.height == other.height \
+			and self.cells == other.cells
+
+	def __hash__(self):
+		# grids are mutable, do not change one while it is used as a key
+		return self.zobrist
+
+	def __repr__(self):
+		return 'Grid(' + str(self.width) + 'x' + str(self.height) + ', ' + str(self.blocked_count()) + ' blocked)'
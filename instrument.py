@@ -0,0 +1,86 @@
+# low overhead counters and timers for the hot paths, plus cProfile snapshots of a running game.
+# Everything is off by default. Instrumented code checks instrument.enabled once per call before
+# counting anything, so with it off a hook costs one attribute lookup and nothing is recorded.
+import time
+import signal
+import cProfile
+import pstats
+import logging
+logger = logging.getLogger('pyGemTD')
+
+enabled = False
+# name -> number
+counts = {}
+# name -> [calls, total seconds, longest seconds]
+timings = {}
+clock = time.perf_counter
+
+_profiler = None
+
+def enable(on=True):
+	global enabled
+	enabled = on
+
+def reset():
+	counts.clear()
+	timings.clear()
+
+def count(name, n=1):
+	counts[name] = counts.get(name, 0) + n
+
+def add_time(name, seconds):
+	t = timings.get(name)
+	if t is None:
+		timings[name] = [1, seconds, seconds]
+		return
+	t[0] += 1
+	t[1] += seconds
+	if seconds > t[2]:
+		t[2] = seconds
+
+def snapshot():
+	"""
+	the counts and the timings (calls, total, mean and max in ms) as one dict
+	"""
+	result = dict(counts)
+	for name, (calls, total, longest) in timings.items():
+		result[name] = {'calls': calls, 'total_ms': total * 1000, 'mean_ms': total * 1000 / calls,
+			'max_ms': longest * 1000}
+	return result
+
+def report():
+	lines = [name + ': ' + str(counts[name]) for name in sorted(counts)]
+	for name in sorted(timings):
+		calls, total, longest = timings[name]
+		lines.append(name + ': ' + str(calls) + ' calls, mean ' + str(round(total * 1000 / calls, 3)) + \
+			' ms, max ' + str(round(longest * 1000, 3)) + ' ms')
+	return '\n'.join(lines)
+
+def toggle_profile(path='pyGemTD.pstats'):
+	"""
+	starts a cProfile run, or stops the running one and dumps its stats to path
+	returns True if profiling is running afterwards
+	"""
+	global _profiler
+	if _profiler is None:
+		_profiler = cProfile.Profile()
+		_profiler.enable()
+		logger.info('Profiling started.')
+		return True
+	_profiler.disable()
+	_profiler.dump_stats(path)
+	stats = pstats.Stats(_profiler)
+	_profiler = None
+	logger.info('Profile written to %s, %s calls in %.3f s.', path, stats.total_calls, stats.total_tt)
+	return False
+
+def profile_on_signal(signum=None, path='pyGemTD.pstats'):
+	"""
+	toggles profiling whenever the process gets signum (SIGUSR1 by default, not on Windows)
+	"""
+	if signum is None:
+		signum = getattr(signal, 'SIGUSR1', None)
+		if signum is None:
+			logger.warning('No SIGUSR1 on this platform, profiling is only available by key.')
+			return
+	signal.signal(signum, lambda s, frame: toggle_profile(path))
@@ -0,0 +1,113 @@
+# a compact binary format for mazes: the blocked cells of a Grid packed to bits together with
+# the route the creeps walk. A 40x40 maze with its 8 route points takes 226 bytes.
+#   magic 'GTDM', version, width, height, number of route points
+#   every route point as x, y, one byte each
+#   the cells, Grid.pack
+# A MazeLibrary is one file of many mazes of the same size and route length, each stored in a
+# record of the same size, so the k-th maze is read straight from a memory map.
+import os
+import mmap
+import struct
+from grid import Grid
+
+MAGIC = b'GTDM'
+VERSION = 1
+HEADER = struct.Struct('<4sBHHB')
+
+LIBRARY_MAGIC = b'GTDL'
+LIBRARY_HEADER = struct.Struct('<4sBI')
+
+def record_size(width, height, points):
+	return HEADER.size + 2 * points + (width * height + 7) // 8
+
+def dumps(grid, route):
+	"""
+	the maze as bytes, route is the list of (x, y) points
+	"""
+	data = [HEADER.pack(MAGIC, VERSION, grid.width, grid.height, len(route))]
+	data.append(bytes(c for point in route for c in point))
+	data.append(grid.pack())
+	return b''.join(data)
+
+def loads(data):
+	"""
+	(grid, route) from dumps bytes
+	"""
+	magic, version, width, height, points = HEADER.unpack_from(data)
+	if magic != MAGIC:
+		raise ValueError('not a maze')
+	if version != VERSION:
+		raise ValueError('unknown maze version ' + str(version))
+	offset = HEADER.size
+	route = [(data[offset + 2*k], data[offset + 2*k + 1]) for k in range(points)]
+	offset += 2 * points
+	return Grid.unpack(width, height, data[offset:offset + (width * height + 7) // 8]), route
+
+def save(path, grid, route):
+	with open(path, 'wb') as f:
+		f.write(dumps(grid, route))
+
+def load(path):
+	with open(path, 'rb') as f:
+		return loads(f.read())
+
+
+class MazeLibrary(object):
+	"""
+	An append only file of mazes with random access by index.
+	The file starts with a header holding the record size, all mazes have to have the same size
+	and number of route points. Reads go through a memory map of the file, so opening a library
+	of millions of mazes reads nothing but the header.
+	"""
+
+	def __init__(self, path, width=40, height=40, points=8):
+		self.path = path
+		if os.path.exists(path) and os.path.getsize(path) >= LIBRARY_HEADER.size:
+			with open(path, 'rb') as f:
+				magic, version, self.record = LIBRARY_HEADER.unpack(f.read(LIBRARY_HEADER.size))
+			if magic != LIBRARY_MAGIC or version != VERSION:
+				raise ValueError(path + ' is not a version ' + str(VERSION) + ' maze library')
+		else:
+			self.record = record_size(width, height, points)
+			with open(path, 'wb') as f:
+				f.write(LIBRARY_HEADER.pack(LIBRARY_MAGIC, VERSION, self.record))
+		self.map = None
+		self.file = None
+
+	def __len__(self):
+		return (os.path.getsize(self.path) - LIBRARY_HEADER.size) // self.record
+
+	def append(self, grid, route):
+		"""
+		adds a maze at the end, returns its index
+		"""
+		data = dumps(grid, route)
+		if len(data) != self.record:
+			raise ValueError('maze of ' + str(len(data)) + ' bytes in a library of ' + str(self.record) + ' byte records')
+		self.close()
+		with open(self.path, 'ab') as f:
+			f.write(data)
+		return len(self) - 1
+
+	def __getitem__(self, k):
+		"""
+		(grid, route) of the k-th maze
+		"""
+		count = len(self)
+		if k < 0:
+			k += count
+		if not 0 <= k < count:
+			raise IndexError('maze ' + str(k) + ' of ' + str(count))
+		if self.map is None or len(self.map) < LIBRARY_HEADER.size + (k + 1) * self.record:
+			self.close()
+			self.file = open(self.path, 'rb')
+			self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		offset = LIBRARY_HEADER.size + k * self.record
+		return loads(self.map[offset:offset + self.record])
+
+	def close(self):
+		if self.map is not None:
+			self.map.close()
+			self.file.close()
+			self.map = None
+			self.file = None
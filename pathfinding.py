@@ -0,0 +1,581 @@
+import heapq
+from collections import deque
+import instrument
+from grid import neighbor_table
+from flowfield import FlowField
+
+def A_star(start, goal, h, d, ne):
+	"""
+	returns the shortest path from start to goal, or False if there is none
+	h: a function giving the weight for any position on the grid
+	d: a distance function between two positions on the grid
+	ne: a function returning the neighbors of a position
+	works on any hashable positions. Positions are numbered as they are discovered, so the
+	open set is a heap of integer ids and the scores are kept in flat lists.
+	"""
+	ids = {start: 0}
+	nodes = [start]
+	gScore = [0]
+	cameFrom = [-1]
+	openSet = [(h(start), 0, 0)]
+	while openSet:
+		f, g, current = heapq.heappop(openSet)
+		if g > gScore[current]:
+			# stale heap entry, the node was reached cheaper in the meantime
+			continue
+		node = nodes[current]
+		if node == goal:
+			path = [node]
+			while cameFrom[current] != -1:
+				current = cameFrom[current]
+				path.append(nodes[current])
+			path.reverse()
+			if instrument.enabled:
+				instrument.count('a_star')
+				instrument.count('a_star_nodes', len(nodes))
+			return path
+		for neighbor in ne(node):
+			tentative_gScore = g + d(node, neighbor)
+			n = ids.get(neighbor)
+			if n is None:
+				n = len(nodes)
+				ids[neighbor] = n
+				nodes.append(neighbor)
+				gScore.append(tentative_gScore)
+				cameFrom.append(current)
+			elif tentative_gScore < gScore[n]:
+				gScore[n] = tentative_gScore
+				cameFrom[n] = current
+			else:
+				continue
+			heapq.heappush(openSet, (tentative_gScore + h(neighbor), tentative_gScore, n))
+	if instrument.enabled:
+		instrument.count('a_star')
+		instrument.count('a_star_nodes', len(nodes))
+	return False
+
+
+def open_route(grid, route):
+	"""
+	clears the fewest blocked cells of grid needed to walk from every point of route to the next
+	one, segment by segment. Every segment is a 0-1 breadth first search where stepping onto a
+	blocked cell costs 1 and onto a free cell nothing, the blocked cells on the cheapest path are
+	cleared. Returns the indices of the cleared cells.
+	"""
+	cells = grid.cells
+	neighbors = grid.neighbors
+	size = len(cells)
+	points = [grid.index(p) for p in route]
+	cleared = [c for c in points if cells[c]]
+	for c in cleared:
+		grid.set(c, 0)
+	for a, b in zip(points, points[1:]):
+		cost = [size] * size
+		came = [-1] * size
+		cost[a] = 0
+		queue = deque([a])
+		while queue:
+			c = queue.popleft()
+			if c == b:
+				break
+			d = cost[c]
+			for n in neighbors[c]:
+				w = d + cells[n]
+				if w < cost[n]:
+					cost[n] = w
+					came[n] = c
+					if cells[n]:
+						queue.append(n)
+					else:
+						queue.appendleft(n)
+		c = b
+		while cost[b] and c != a:
+			if cells[c]:
+				grid.set(c, 0)
+				cleared.append(c)
+			c = came[c]
+	return cleared
+
+
+class GridAStar(object):
+	"""
+	Shortest paths on a 4-connected grid where every move costs 1.
+	Cells are integer indices (x * height + y). All scores live in flat lists that are
+	allocated once and reused by every search, a cell's entry is only valid if its stamp
+	matches the current search.
+	search picks one of three strategies per call, all find paths of the same length:
+	- 'a_star': plain A* with the manhattan distance
+	- 'jump_point': jump point search, only the cells where a shortest path may turn are expanded
+	- 'bidirectional': breadth first from both ends, the smaller frontier grows first
+	"""
+
+	modes = ('a_star', 'jump_point', 'bidirectional')
+
+	def __init__(self, width, height):
+		self.width = width
+		self.height = height
+		size = width * height
+		self.xs = [i // height for i in range(size)]
+		self.ys = [i % height for i in range(size)]
+		self.neighbors = neighbor_table(width, height)
+		self.gScore = [0] * size
+		self.cameFrom = [-1] * size
+		self.stamp = [0] * size
+		self.closed = [0] * size
+		# the search from the goal of bidirectional
+		self.bScore = [0] * size
+		self.bCameFrom = [-1] * size
+		self.bStamp = [0] * size
+		self.search_id = 0
+		# number of cells expanded by the last search
+		self.expanded = 0
+
+	def index(self, pos):
+		return pos[0] * self.height + pos[1]
+
+	def position(self, i):
+		return (self.xs[i], self.ys[i])
+
+	def search(self, start, goal, blocked, mode='a_star'):
+		"""
+		returns the shortest path from start to goal as a list of cell indices, or False if there is none
+		blocked: anything indexable by cell index that is truthy for cells that cannot be entered
+		mode: one of modes
+		"""
+		if mode not in self.modes:
+			raise ValueError('unknown search mode ' + str(mode))
+		if blocked[start] or blocked[goal]:
+			# no mode may start or end a path on a blocked cell
+			self.expanded = 0
+			path = False
+		elif mode == 'a_star':
+			path = self.a_star(start, goal, blocked)
+		elif mode == 'jump_point':
+			path = self.jump_point(start, goal, blocked)
+		else:
+			path = self.bidirectional(start, goal, blocked)
+		if instrument.enabled:
+			instrument.count('grid_' + mode)
+			instrument.count('grid_' + mode + '_expanded', self.expanded)
+		return path
+
+	def a_star(self, start, goal, blocked):
+		self.search_id += 1
+		sid = self.search_id
+		xs, ys = self.xs, self.ys
+		neighbors = self.neighbors
+		gScore, cameFrom, stamp, closed = self.gScore, self.cameFrom, self.stamp, self.closed
+		gx, gy = xs[goal], ys[goal]
+		heappush, heappop = heapq.heappush, heapq.heappop
+		stamp[start] = sid
+		gScore[start] = 0
+		cameFrom[start] = -1
+		# ties on f are broken towards the larger g, which keeps the search on the straight line
+		openSet = [(abs(xs[start] - gx) + abs(ys[start] - gy), 0, start)]
+		expanded = 0
+		while openSet:
+			f, _, current = heappop(openSet)
+			if closed[current] == sid:
+				continue
+			if current == goal:
+				self.expanded = expanded
+				return self.reconstruct_path(current)
+			closed[current] = sid
+			expanded += 1
+			g = gScore[current] + 1
+			for n in neighbors[current]:
+				if blocked[n] or closed[n] == sid:
+					continue
+				if stamp[n] != sid or g < gScore[n]:
+					stamp[n] = sid
+					gScore[n] = g
+					cameFrom[n] = current
+					heappush(openSet, (g + abs(xs[n] - gx) + abs(ys[n] - gy), -g, n))
+		self.expanded = expanded
+		return False
+
+	def jump_x(self, c, dx, goal, blocked):
+		"""
+		walks from c along x (dx is +-1) and returns the first jump point, -1 if there is none.
+		A cell is a jump point if it is the goal or if a path may have to turn there: the cell
+		above or below it is free while the one above or below the cell before it is blocked
+		"""
+		h = self.height
+		step = dx * h
+		end = self.width if dx > 0 else -1
+		y = self.ys[c]
+		up = y > 0
+		down = y < h - 1
+		x = self.xs[c] + dx
+		while x != end:
+			n = c + step
+			if blocked[n]:
+				return -1
+			if n == goal:
+				return n
+			if up and not blocked[n - 1] and blocked[c - 1]:
+				return n
+			if down and not blocked[n + 1] and blocked[c + 1]:
+				return n
+			c = n
+			x += dx
+		return -1
+
+	def jump_y(self, c, dy, goal, blocked):
+		"""
+		walks from c along y (dy is +-1) and returns the first jump point, -1 if there is none.
+		Paths walk along y first and turn to x anywhere, so a cell is a jump point if it is the
+		goal or if walking along x from it finds a jump point
+		"""
+		end = self.height if dy > 0 else -1
+		y = self.ys[c] + dy
+		while y != end:
+			c += dy
+			if blocked[c]:
+				return -1
+			if c == goal or self.jump_x(c, 1, goal, blocked) != -1 or self.jump_x(c, -1, goal, blocked) != -1:
+				return c
+			y += dy
+		return -1
+
+	def jump_point(self, start, goal, blocked):
+		"""
+		jump point search for 4-connected grids: successors are found by jumping in straight
+		lines and only the jump points go into the open set. Moving along y may turn to x at any
+		cell, moving along x only turns to y at cells with a forced neighbor
+		"""
+		self.search_id += 1
+		sid = self.search_id
+		xs, ys = self.xs, self.ys
+		h = self.height
+		gScore, cameFrom, stamp, closed = self.gScore, self.cameFrom, self.stamp, self.closed
+		gx, gy = xs[goal], ys[goal]
+		heappush, heappop = heapq.heappush, heapq.heappop
+		jump_x, jump_y = self.jump_x, self.jump_y
+		stamp[start] = sid
+		gScore[start] = 0
+		cameFrom[start] = -1
+		openSet = [(abs(xs[start] - gx) + abs(ys[start] - gy), 0, start)]
+		expanded = 0
+		while openSet:
+			f, _, current = heappop(openSet)
+			if closed[current] == sid:
+				continue
+			if current == goal:
+				self.expanded = expanded
+				return self.reconstruct_jumps(current)
+			closed[current] = sid
+			expanded += 1
+			cx, cy = xs[current], ys[current]
+			parent = cameFrom[current]
+			if parent == -1:
+				directions = ((1, 0), (-1, 0), (0, 1), (0, -1))
+			elif xs[parent] == cx:
+				# came along y, go on and turn to both sides
+				dy = 1 if cy > ys[parent] else -1
+				directions = ((0, dy), (1, 0), (-1, 0))
+			else:
+				# came along x, go on and turn where a neighbor is forced
+				dx = 1 if cx > xs[parent] else -1
+				directions = [(dx, 0)]
+				before = current - dx * h
+				if cy > 0 and not blocked[current - 1] and blocked[before - 1]:
+					directions.append((0, -1))
+				if cy < h - 1 and not blocked[current + 1] and blocked[before + 1]:
+					directions.append((0, 1))
+			for dx, dy in directions:
+				n = jump_x(current, dx, goal, blocked) if dx else jump_y(current, dy, goal, blocked)
+				if n == -1 or closed[n] == sid:
+					continue
+				g = gScore[current] + abs(xs[n] - cx) + abs(ys[n] - cy)
+				if stamp[n] != sid or g < gScore[n]:
+					stamp[n] = sid
+					gScore[n] = g
+					cameFrom[n] = current
+					heappush(openSet, (g + abs(xs[n] - gx) + abs(ys[n] - gy), -g, n))
+		self.expanded = expanded
+		return False
+
+	def reconstruct_jumps(self, current):
+		# fills in the straight lines between the jump points
+		cameFrom = self.cameFrom
+		path = [current]
+		while cameFrom[current] != -1:
+			parent = cameFrom[current]
+			step = 1 if abs(parent - current) < self.height else self.height
+			if parent < current:
+				step = -step
+			c = current + step
+			while c != parent:
+				path.append(c)
+				c += step
+			path.append(parent)
+			current = parent
+		path.reverse()
+		return path
+
+	def bidirectional(self, start, goal, blocked):
+		"""
+		breadth first search from start and from goal at once, a whole layer of the smaller frontier
+		at a time. Once the frontiers touch, the best meeting found in that layer is a shortest path
+		"""
+		self.search_id += 1
+		sid = self.search_id
+		neighbors = self.neighbors
+		fScore, fCameFrom, fStamp = self.gScore, self.cameFrom, self.stamp
+		bScore, bCameFrom, bStamp = self.bScore, self.bCameFrom, self.bStamp
+		fStamp[start] = bStamp[goal] = sid
+		fScore[start] = bScore[goal] = 0
+		fCameFrom[start] = bCameFrom[goal] = -1
+		if start == goal:
+			self.expanded = 0
+			return [start]
+		forward, backward = [start], [goal]
+		expanded = 0
+		while forward and backward:
+			if len(forward) <= len(backward):
+				frontier, score, cameFrom, stamp, other, otherScore = forward, fScore, fCameFrom, fStamp, bStamp, bScore
+			else:
+				frontier, score, cameFrom, stamp, other, otherScore = backward, bScore, bCameFrom, bStamp, fStamp, fScore
+			best = None
+			following = []
+			for c in frontier:
+				expanded += 1
+				g = score[c] + 1
+				for n in neighbors[c]:
+					# a cell is only ever stamped by one side, the other side meets it
+					if stamp[n] == sid or blocked[n]:
+						continue
+					if other[n] == sid:
+						total = g + otherScore[n]
+						if best is None or total < best[0]:
+							best = (total, c, n)
+					else:
+						stamp[n] = sid
+						score[n] = g
+						cameFrom[n] = c
+						following.append(n)
+			if best is not None:
+				self.expanded = expanded
+				total, c, n = best
+				if frontier is backward:
+					c, n = n, c
+				# c is reached from start, n from goal
+				path = self.reconstruct_path(c)
+				while n != -1:
+					path.append(n)
+					n = bCameFrom[n]
+				return path
+			if frontier is forward:
+				forward = following
+			else:
+				backward = following
+		self.expanded = expanded
+		return False
+
+	def route(self, points, blocked, mode='a_star'):
+		"""
+		searches the segments between consecutive cells of points one after the other, all with
+		the same buffers. Returns (path, lengths, unreachable):
+		path: the segment paths chained together, the points joining two segments appear twice.
+		It ends at the last point that could be reached
+		lengths: the number of cells of every segment path. The search stops at the first segment
+		without a path, it and all segments after it are 0
+		unreachable: the first point that can not be reached, None if all can
+		"""
+		path = []
+		lengths = []
+		unreachable = None
+		expanded = 0
+		for s in range(len(points) - 1):
+			if unreachable is not None:
+				lengths.append(0)
+				continue
+			if blocked[points[s]] or blocked[points[s+1]]:
+				# a blocked start can not be left, either way the point after it counts as unreachable
+				segment = False
+			else:
+				segment = self.search(points[s], points[s+1], blocked, mode)
+				expanded += self.expanded
+			if segment:
+				path.extend(segment)
+				lengths.append(len(segment))
+			else:
+				lengths.append(0)
+				unreachable = points[s+1]
+		self.expanded = expanded
+		return path, lengths, unreachable
+
+	def reconstruct_path(self, current):
+		cameFrom = self.cameFrom
+		path = [current]
+		while cameFrom[current] != -1:
+			current = cameFrom[current]
+			path.append(current)
+		path.reverse()
+		return path
+
+
+class SegmentPaths(object):
+	"""
+	The shortest paths between consecutive points of a route on a Grid, kept up to date
+	cell by cell. Every segment is searched with a flow field towards its end point, which
+	creeps can follow as well. After a single cell of the grid changed, cell_changed only
+	searches the segments that change can affect:
+	- a blocked cell only matters to the segments whose path runs over it
+	- a cleared cell only matters to segments that could get shorter by passing it
+	- changing a cell back right after changing it restores the previous paths
+	"""
+
+	def __init__(self, grid, route):
+		self.grid = grid
+		self.route = [grid.index(p) for p in route]
+		# the flow field of every segment and the path it leads along as a list of cell
+		# indices, False if there is none
+		self.fields = [None] * (len(self.route) - 1)
+		self.paths = [False] * (len(self.route) - 1)
+		# bit s of usage[c] is set when the path of segment s runs over cell c
+		size = grid.width * grid.height
+		self.usage = bytearray(size) if len(self.paths) <= 8 else [0] * size
+		# (cell, value after the change, [(segment, field before the change)])
+		self.last_change = None
+		self.refresh()
+
+	def refresh(self, cancelled=None):
+		"""
+		searches every segment from scratch
+		cancelled: optional function asked before every segment, once it returns True the search
+		stops half done and refresh returns False
+		"""
+		for s in range(len(self.paths)):
+			if cancelled is not None and cancelled():
+				return False
+			self.set_field(s, self.search(s))
+		self.last_change = None
+		return True
+
+	def copy(self, grid):
+		"""
+		the same paths on grid, a copy of the grid they were searched on
+		"""
+		other = SegmentPaths.__new__(SegmentPaths)
+		other.grid = grid
+		other.route = self.route
+		# fields and paths are replaced but never changed, they can be shared
+		other.fields = self.fields[:]
+		other.paths = self.paths[:]
+		other.usage = self.usage[:]
+		other.last_change = self.last_change
+		return other
+
+	def search(self, s):
+		return FlowField(self.grid, self.route[s+1], until=self.route[s])
+
+	def set_field(self, s, field):
+		usage = self.usage
+		bit = 1 << s
+		if self.paths[s]:
+			for c in self.paths[s]:
+				usage[c] &= ~bit
+		path = field.path(self.route[s])
+		if path:
+			for c in path:
+				usage[c] |= bit
+		self.fields[s] = field
+		self.paths[s] = path
+
+	def cell_changed(self, pos):
+		"""
+		updates the paths after the cell at pos was blocked or cleared, returns is_valid()
+		"""
+		grid = self.grid
+		c = grid.index(pos)
+		value = grid.cells[c]
+		last = self.last_change
+		if self.undoes(pos):
+			# the last change was undone, so were its paths
+			for s, field in last[2]:
+				self.set_field(s, field)
+			self.last_change = None
+			return self.is_valid()
+		if value:
+			mask = self.usage[c]
+			affected = [s for s in range(len(self.paths)) if mask >> s & 1]
+		else:
+			affected = [s for s in range(len(self.paths)) if self.could_shorten(s, c)]
+		saved = []
+		for s in affected:
+			saved.append((s, self.fields[s]))
+			self.set_field(s, self.search(s))
+		self.last_change = (c, value, saved)
+		return self.is_valid()
+
+	def undoes(self, pos):
+		"""
+		True if the cell at pos changed back since the last change, cell_changed then restores
+		the paths from before it without a search
+		"""
+		c = self.grid.index(pos)
+		last = self.last_change
+		return bool(last) and last[0] == c and last[1] != self.grid.cells[c]
+
+	def could_shorten(self, s, c):
+		"""
+		False if a path over the freshly cleared cell c can not be shorter than segment s is now
+		"""
+		path = self.paths[s]
+		if not path:
+			return True
+		a, b = self.route[s], self.route[s+1]
+		if c == a or c == b:
+			return True
+		cells = self.grid.cells
+		if sum(1 for n in self.grid.neighbors[c] if not cells[n]) < 2:
+			# a dead end can not be part of a shortest path
+			return False
+		x, y = divmod(c, self.grid.height)
+		ax, ay = divmod(a, self.grid.height)
+		bx, by = divmod(b, self.grid.height)
+		return abs(x - ax) + abs(y - ay) + abs(x - bx) + abs(y - by) < len(path) - 1
+
+	def segments_over(self, pos):
+		"""
+		bitmask of the segments whose path runs over the cell at pos
+		"""
+		return self.usage[self.grid.index(pos)]
+
+	def is_valid(self):
+		return all(self.paths)
+
+	def unreachable(self):
+		"""
+		the position of the first route point that can not be reached, None if all can
+		"""
+		for s, path in enumerate(self.paths):
+			if not path:
+				return self.grid.position(self.route[s+1])
+		return None
+
+	def length(self):
+		"""
+		the summed number of cells of all segment paths
+		"""
+		return sum(len(p) for p in self.paths if p)
+
+	def lengths(self):
+		"""
+		the number of cells of every segment path, 0 for segments without one
+		"""
+		return [len(p) if p else 0 for p in self.paths]
+
+	def path(self):
+		"""
+		all segment paths chained together, the points joining two segments appear twice
+		the path ends at the last route point that can be reached
+		"""
+		result = []
+		for p in self.paths:
+			if not p:
+				break
+			result.extend(p)
+		return result
@@ -0,0 +1,122 @@
+# path searches on a worker thread, so the game loop keeps drawing at its frame rate while they run.
+# A job works on a shadow of the game (Game.shadow), a copy of its board, routes and cut index.
+# When it is done the game loop adopts the shadow in one go, until then the game keeps its last
+# path. A shadow is only adopted if the game did not change since it was made, otherwise the job
+# is started again on a fresh one. A newer request or edit cancels a running path search between
+# two segments.
+import logging
+from concurrent.futures import ThreadPoolExecutor
+logger = logging.getLogger('pyGemTD')
+
+# kinds of jobs
+PATH = 'path'
+RESET = 'reset'
+BLOCK = 'block'
+
+class PathWorker(object):
+	"""
+	Runs make_path, a reset to the empty board and block_cell of a Game on a worker thread.
+	request_path and request_block start jobs, poll has to be called by the game loop every frame.
+	It adopts the finished jobs and returns them as (kind, pos, valid, unreachable) tuples, the same
+	valid and unreachable block_cell returns, pos is None for PATH and RESET.
+	"""
+
+	def __init__(self, game):
+		self.game = game
+		self.executor = ThreadPoolExecutor(max_workers=1)
+		# bumped to cancel the running search, a search stops once it is not the latest one
+		self.generation = 0
+		# (kind, pos, shadow, cells, future) of the running job
+		self.job = None
+		# PATH or RESET still to be done after the running job
+		self.wanted = None
+
+	def busy(self):
+		return self.job is not None or self.wanted is not None
+
+	def request_path(self, reset=False):
+		"""
+		searches the path again, on the empty board for reset. A running path search is cancelled
+		"""
+		if reset or self.wanted is None:
+			self.wanted = RESET if reset else PATH
+		if self.job is not None and self.job[0] != BLOCK:
+			if self.job[0] == RESET:
+				self.wanted = RESET
+			self.cancel_search()
+		self.start_next()
+
+	def request_block(self, pos):
+		"""
+		checks and does blocking the cell at pos, False if another block is still running.
+		A running path search is cancelled and started again after the block
+		"""
+		if self.job is not None:
+			if self.job[0] == BLOCK:
+				return False
+			self.wanted = self.wanted or self.job[0]
+			self.cancel_search()
+		self.start(BLOCK, pos)
+		return True
+
+	def cancel(self):
+		"""
+		forgets the running job and everything wanted, for when the game is replaced
+		"""
+		self.cancel_search()
+		self.wanted = None
+
+	def cancel_search(self):
+		self.generation += 1
+		self.job = None
+
+	def start(self, kind, pos=None):
+		game = self.game
+		shadow = game.shadow()
+		self.job = (kind, pos, shadow, (bytes(game.board.cells), game.changes),
+			self.executor.submit(self.run, kind, pos, shadow, self.generation))
+
+	def start_next(self):
+		if self.job is None and self.wanted is not None:
+			kind, self.wanted = self.wanted, None
+			self.start(kind)
+
+	def run(self, kind, pos, shadow, generation):
+		# on the worker thread, None if the search was cancelled
+		if kind == BLOCK:
+			return shadow.block_cell(pos)
+		if kind == RESET:
+			board = shadow.board
+			for c in range(len(board.cells)):
+				board.set(c, 0)
+		if not shadow.routes.refresh(lambda: generation != self.generation):
+			return None
+		shadow.cuts.invalidate()
+		return (shadow.routes.is_valid(), shadow.routes.unreachable())
+
+	def poll(self):
+		game = self.game
+		done = []
+		if self.job is not None:
+			kind, pos, shadow, state, future = self.job
+			current = state == (bytes(game.board.cells), game.changes)
+			if not current and kind != BLOCK:
+				# an edit made the search useless, it starts again once the edits allow
+				logger.debug('The board changed, searching the %s again', kind)
+				self.wanted = RESET if RESET in (kind, self.wanted) else PATH
+				self.cancel_search()
+			elif future.done():
+				self.job = None
+				result = future.result()
+				if not current:
+					if not game.board.is_blocked(pos):
+						self.start(BLOCK, pos)
+				elif result is not None:
+					game.adopt(shadow)
+					done.append((kind, pos) + result)
+		self.start_next()
+		return done
+
+	def close(self):
+		self.cancel()
+		self.executor.shutdown(wait=True)
@@ -1,8 +1,18 @@
+import os
+import time
 import pygame
-import math
 import logging
+import argparse
+from collections import OrderedDict
+import simulation
+import vectorwave
+import instrument
+import replay
+import pathworker
+# A_star and the headless names are kept importable from here for older callers
+from pathfinding import A_star
+from simulation import width, height, tile_multiplier, cartesian_distance
 pygame.init()
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)-15s %(funcName)s %(lineno)d %(message)s')
 logger = logging.getLogger('pyGemTD')
 
 colors = {
@@ -20,14 +30,48 @@ colors = {
 	'skill_arcWave' : pygame.Color('#ECA26A'),
 	'ground_path' : pygame.Color('#e0bd3e'),
 }
-# a square screen makes for maximum maze possibilities. 1k might be too much vertically, though
-width = 1000
-height = 1000
-tile_multiplier = 25
 arial_font = pygame.font.SysFont('arial',10)
 clock = pygame.time.Clock()
 
-# render queue for background entities
+class TextCache(object):
+	"""
+	Rendered text surfaces by (text, font, color), so a label is only rendered once.
+	The least recently used surfaces are dropped beyond maxsize.
+	"""
+
+	def __init__(self, maxsize=256):
+		self.maxsize = maxsize
+		self.surfaces = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def render(self, text, font=None, color=None):
+		# font defaults to arial_font, color to the waypoint text color
+		font = arial_font if font is None else font
+		color = colors['text_waypoint'] if color is None else color
+		# pygame colors are not hashable, the key uses the rgba tuple
+		key = (text, font, tuple(color))
+		surface = self.surfaces.get(key)
+		if surface is not None:
+			self.surfaces.move_to_end(key)
+			self.hits += 1
+			return surface
+		self.misses += 1
+		surface = font.render(text, True, color)
+		self.surfaces[key] = surface
+		if len(self.surfaces) > self.maxsize:
+			self.surfaces.popitem(last=False)
+		return surface
+
+	def __repr__(self):
+		return 'TextCache(' + str(len(self.surfaces)) + '/' + str(self.maxsize) + ' surfaces, ' + \
+			str(self.hits) + ' hits, ' + str(self.misses) + ' misses)'
+
+# shared by everything drawing text, tile labels and the hud
+text_cache = TextCache()
+
+# render queue for background entities like animations, drawn every frame. Tiles are not
+# in here, the Renderer only redraws the ones that changed
 background = []
 
 # grid tile types
@@ -35,56 +79,58 @@ FREE = 'F'
 BLOCKED = 'B'
 WAYPOINT = 'W'
 
-def reconstruct_path(cameFrom, current):
+class Renderer(object):
 	"""
-	reverse-walks the the cameFrom dict to construct the path contained starting from current
+	Draws frames of a Game by only updating what changed on screen.
+	The board is kept on its own surface. Each frame only the tiles whose color changed since
+	the last frame are drawn onto it, the board is copied back where creeps were drawn last
+	frame, the creeps are drawn and only those rects are passed to display.update.
 	"""
-	path = [current]
-	while current in cameFrom:
-		current = cameFrom[current]
-		path = [current] + path
-	return path
 
-def cartesian_distance(one, other):
-	"""
-	geometric line distance between two points
-	"""
-	return math.sqrt((other[0] - one[0])**2 + (other[1] - one[1])**2)
+	def __init__(self, display, game):
+		self.display = display
+		self.game = game
+		self.board = pygame.Surface(display.get_size())
+		# rects the creeps were drawn on in the last frame
+		self.creep_rects = []
+		self.redraw()
+
+	def redraw(self):
+		# draws everything, for the first frame or when the display was drawn over
+		for tile in self.game.grid.values():
+			tile.draw(self.board)
+		self.game.dirty_tiles.clear()
+		self.display.blit(self.board, (0, 0))
+		self.creep_rects = []
+		pygame.display.update()
 
-def A_star(start, goal, h, d, ne):
+	def draw(self):
+		display = self.display
+		rects = []
+		for r in self.creep_rects:
+			display.blit(self.board, r, r)
+			rects.append(r)
+		for b in background[:]:
+			b.draw(display)
+		dirty = self.game.dirty_tiles
+		for tile in dirty:
+			r = tile.draw(self.board)
+			display.blit(self.board, r, r)
+			rects.append(r)
+		dirty.clear()
+		self.creep_rects = []
+		for w in self.game.current_waves:
+			self.creep_rects.extend(w.draw(display))
+		rects.extend(self.creep_rects)
+		pygame.display.update(rects)
+
+def render_observer(renderer):
 	"""
-	returns the shortest path from start to goal, or False if there is none
-	h: a function giving the weight for any position on the grid
-	d: a distance function between two positions on the grid
-	ne: a function returning the neighbors of a position
+	an observer for simulation.Simulation that draws frames with a Renderer
 	"""
-	openSet = set()
-	openSet.add(start)
-	cameFrom = {}
-	gScore = {}
-	gScore[start] = 0
-	fScore = {}
-	fScore[start] = h(start)
-	while len(openSet) > 0:
-		current = None
-		#print('fScore ', fScore)
-		for n in openSet:
-			if not current or fScore[n] < fScore[current]:
-				current = n
-		if current == goal:
-			return reconstruct_path(cameFrom, current)
-		#print(current, openSet)
-		openSet.remove(current)
-		for neighbor in ne(current):
-			#print(neighbor)
-			tentative_gScore = gScore[current] + d(current, neighbor)
-			if neighbor not in gScore or tentative_gScore < gScore[neighbor]:
-				cameFrom[neighbor] = current
-				gScore[neighbor] = tentative_gScore
-				fScore[neighbor] = gScore[neighbor] + h(neighbor)
-				if neighbor not in openSet:
-					openSet.add(neighbor)
-	return False
+	def observe(game, tick):
+		renderer.draw()
+	return observe
 
 class BlinkingTileAnimation(object):
 
@@ -98,37 +144,54 @@ class BlinkingTileAnimation(object):
 	def draw(self, surface):
 		self.timer += 1
 		if self.timer == 60:
-			tile.color = colors['ground']
+			self.tile.color = colors['ground']
 			background.remove(self)
 		elif self.timer % 10 == 0:
 			self.flick = 0 if self.flick == 1 else 1
-			tile.color = self.colors[self.flick]
+			self.tile.color = self.colors[self.flick]
 
 
 class Tile(object):
 	"""
 	A Tile is 10 px square on the board and the smallest buildable unit
+	the blocked state is mirrored into the compact board grid of the game, every color change
+	puts the tile into the dirty set so it is redrawn
 	"""
 
-	def __init__(self, x, y):
-		pygame.sprite.Sprite.__init__(self)
-		background.append(self)
+	__slots__ = ('dirty', 'rect', '_color', 'type', 'x', 'y', 'text', 'board', 'index')
+
+	def __init__(self, x, y, board, dirty):
+		self.dirty = dirty
 		self.rect = pygame.Rect(x*tile_multiplier, y*tile_multiplier, tile_multiplier, tile_multiplier)
 		self.color = colors['ground']
 		self.type = FREE
 		self.x = x
 		self.y = y
 		self.text = None
+		self.board = board
+		self.index = board.index((x, y))
+
+	@property
+	def color(self):
+		return self._color
+
+	@color.setter
+	def color(self, color):
+		self._color = color
+		self.dirty.add(self)
 
 	def draw(self, surface):
+		# returns the rect that was drawn on
 		pygame.draw.rect(surface, self.color, self.rect, 0)
 		if self.text:
-			textsurface = arial_font.render(self.text, True, colors['text_waypoint'])
-			surface.blit(textsurface, self.rect.midtop)
+			textsurface = text_cache.render(self.text)
+			return self.rect.union(surface.blit(textsurface, self.rect.midtop))
+		return self.rect
 
 	def clear(self):
 		self.color = colors['ground']
 		self.type = FREE
+		self.board.set(self.index, 0)
 
 	def reset(self):
 		# does not change the type, resets the color to remove a path
@@ -142,10 +205,12 @@ class Tile(object):
 	def block(self):
 		self.color = colors['ground_blocked']
 		self.type = BLOCKED
+		self.board.set(self.index, 1)
 
 	def waypoint(self):
 		self.color = colors['ground_waypoint']
 		self.type = WAYPOINT
+		self.board.set(self.index, 0)
 
 	def path(self, color = colors['ground_path']):
 		self.color = color
@@ -153,212 +218,87 @@ class Tile(object):
 	def __repr__(self):
 		return '('+str(self.x) + ',' + str(self.y) + ')'
 
-class Wave(object):
+class Wave(simulation.Wave):
 	"""
-	A wave is a group of creeps.
-	A wave is started by the game
-	Assumption: As there is no building/removing of blocks during a wave, the path of all creeps in one
-	wave is the same. 
+	A wave that draws its creeps
 	"""
 
-	def __init__(self, size, creep_generator, gap):
-		#the size is the number of creeps in this wave
-		self.size = size
-		#the creep generator is a function without argument that will create creeps for this wave
-		self.creep_generator = creep_generator
-		#the gap is the number of ticks that passes between creeps starting
-		self.gap = gap
-		#the gap_ticker is the counter looping the gap
-		self.gap_ticker = 0
-		#the creeps in ths wave
-		self.creeps = []
-		#a flag indicating if this wave is active, a wave is active when there are still creeps active
-		self.active = False
-		#a flag indicating if this wave is released, a wave is released when all the creeps are on their way
-		self.released = False
-		# the path is not required at creation time (may change since then) but has to be set before creeps
-		# can be sent. Is the same for all creeps in the wave
-		self.path = []
-		logger.debug('Created Wave ' + str(id(self)) + ' with ' + str(self.size) + ' creeps and ' + str(self.gap) + ' ticks gap.')
-
-	def update(self):
-		#Assumption: update is only called when the wave is active and has the task to
-		# create creeps until all are there
-		# manage the lifecycle of the creeps
-		# keep the wave flags active/released correct
-		if not self.released:
-			if self.gap_ticker == self.gap:
-				creep = self.creep_generator()
-				creep.path = self.path[:]
-				creep.activate()
-				self.creeps.append(creep)
-				self.gap_ticker = 0
-				logger.debug('Wave ' + str(id(self)) + ' releases creep ' + str(creep))
-				if len(self.creeps) == self.size:
-					logger.debug('Wave ' + str(id(self)) + ' has released all of its creeps.')
-					self.released = True
-			else:
-				self.gap_ticker += 1
-		# assumption: creeps keep their flags (active, dead, breached) updates themselves
-		for c in [c for c in self.creeps if c.active]:
-			c.update()
-		# recalculate if a creep is now inactive (optimization potential ...)
-		if self.released and len([c for c in self.creeps if c.active]) == 0:
-			#logger.debug('Wave ' + str(id(self)) + ' has no more active creeps.')
-			self.active = False
+	__slots__ = ()
 
 	def draw(self, surface):
-		for c in [c for c in self.creeps if c.active]:
-			c.draw(surface)
-
-
-
-
-class Creep(object):
-
-	def __init__(self, hp, speed, creep_type):
-		self.pos = None
-		self.hp = hp
-		# size is the radius of the circle that represents the creep
-		#TODO change creeps to animated sprites
-		self.size = 4
-		self.currnet_hp = self.hp
-		self.speed = speed
-		self.current_speed = self.speed
-		# creep types can either be things like immune/fast/boss/group
-		#TODO decide how flying and potentially other types (spawn) are handled. type or sublcass
-		self.type = creep_type
-		self.rect = None
-		#TODO stun flag/timer, slowed flag/timer/amount
-		# when a creep is active it is on the map and walks
-		self.active = False
-		# when a creep is breached it made it to the end alive
-		self.breached = False
-		self.path = []
-		#the point currently walking towards
-		self.current_destination = None
-		self.dead = False
-
-	def activate(self):
-		#activating sets the position to the first item in the path, the destination to the second
-		#and updates the path to the remainder
-		self.active = True
-		self.pos = (round(self.path[0].x * tile_multiplier + 0.5 * tile_multiplier), \
-			round(self.path[0].y * tile_multiplier + 0.5 * tile_multiplier))
-		self.current_destination = (round(self.path[1].x * tile_multiplier + 0.5 * tile_multiplier), \
-			round(self.path[1].y * tile_multiplier + 0.5 * tile_multiplier))
-		self.path = self.path[2:]
-		logger.debug('Creep ' + str(self) + ' is now active.')
-
-	def die(self):
-		self.active = False
-
-	def breach(self):
-		logger.debug('Creep ' + str(self) + ' has breached.')
-		self.breached = True
-		self.active = False
-
-	def update(self):
-		# update means the creep is active, so it is walking
-		#TODO implement things like stunned and slowed
-		#pos and current_destination are tuples, not objects
-		#the coordinates of the path have to be translated to screen coordinates
-		#logger.debug('Creep Position before update: ' + str(self.pos) + '. Destination ' + str(self.current_destination))
-		#check if we are done with the path, if so, breach
-		if cartesian_distance(self.pos, self.current_destination) <= self.speed:
-			if len(self.path) == 0:
-				self.breach()
-				return
-			else:
-				self.current_destination = (round(self.path[0].x * tile_multiplier + 0.5 * tile_multiplier), \
-					round(self.path[0].y * tile_multiplier + 0.5 * tile_multiplier))
-				self.path = [] if len(self.path) == 1 else self.path[1:]
-		#now we walk. x first, then y
-		if abs(self.pos[0] - self.current_destination[0]) > self.speed:
-			if self.pos[0] < self.current_destination[0]:
-				#we are walking right
-				self.pos = (self.pos[0] + self.speed, self.pos[1])
-			else:
-				#we are walking left
-				self.pos = (self.pos[0] - self.speed, self.pos[1])
-		else:
-			#as we are active so we are not breached, y it has to be
-			if self.pos[1] < self.current_destination[1]:
-				#we are walking down
-				self.pos = (self.pos[0], self.pos[1] + self.speed)
-			else:
-				#we are walking up
-				self.pos = (self.pos[0], self.pos[1] - self.speed)
-		#logger.debug('Creep Position after update: ' + str(self.pos) + '. Destination ' + str(self.current_destination))
+		# returns the rects that were drawn on
+		return [c.draw(surface) for c in self.creeps if c.active]
+
+
+class Creep(simulation.Creep):
+	"""
+	A creep drawn as a circle
+	"""
+
+	__slots__ = ()
 
 	def draw(self, surface):
-		pygame.draw.circle(surface, colors['creep'], self.pos, self.size, 0)
+		return pygame.draw.circle(surface, colors['creep'], self.pos, self.size, 0)
 
-	def __repr__(self):
-		return 'Creep(' + str(id(self)) + ')@' + str(self.pos)
 
-class Game(object):
+class VectorWave(vectorwave.VectorWave):
+	"""
+	A vectorized wave drawn as circles
+	"""
+
+	def draw(self, surface):
+		# returns the rects that were drawn on
+		return [pygame.draw.circle(surface, colors['creep'], pos, 4, 0) for pos in self.positions().tolist()]
+
+
+class Game(simulation.Game):
+	"""
+	The game with a Tile for every board cell. path holds the Tiles of the path
+	"""
 
 	def __init__(self):
+		super().__init__()
+		# the tiles that changed color since the last frame
+		self.dirty_tiles = set()
+		# a replay.Recorder getting every tile blocked or cleared
+		self.recorder = None
 		# initialize the grid with Tiles
 		self.grid = {}
 		for x in range(width//tile_multiplier):
 			for y in range(height//tile_multiplier):
-				self.grid[(x,y)] = Tile(x,y)
-		# define the waypoints, in relation to the tile_multiplier
-		self.start = (0,125//tile_multiplier)
-		self.waypoints = [(125//tile_multiplier,125//tile_multiplier),(125//tile_multiplier,475//tile_multiplier),\
-		(825//tile_multiplier,475//tile_multiplier),(825//tile_multiplier,125//tile_multiplier),\
-		(475//tile_multiplier,125//tile_multiplier),(475//tile_multiplier,825//tile_multiplier)]
-		self.end = (990//tile_multiplier,800//tile_multiplier)
-		self.path = []
-		# the waves currently active
-		self.current_waves = []
+				self.grid[(x,y)] = Tile(x,y,self.board,self.dirty_tiles)
 
 	def show_waypoints(self):
 		"""
 		colors and blocks the waypoint tiles around the waypoints
 		"""
+		for pos in self.waypoint_area():
+			self.grid[pos].waypoint()
 		for i,point in enumerate(self.waypoints):
-			for x in range(4):
-				for y in range(4):
-					self.grid[(point[0]-1+x,point[1]-1+y)].waypoint()
 			self.grid[point].text = str(i)
 
 	def get_neighbor(self, tile):
 		# diagonal tiles are not neighbors, only above, below, right, left
-		result = []
-		coords = ((tile.x-1,tile.y),(tile.x+1,tile.y),(tile.x,tile.y-1),(tile.x,tile.y+1))
-		for (x,y) in coords:
-			if x < 0 or y < 0 or x > (990//tile_multiplier) or y > (990//tile_multiplier):
-				continue
-			n = self.grid[(x,y)]
-			if n.type != BLOCKED:
-				#print(n.type)
-				result.append(n)
-		return result
-
-	def make_path(self):
-		"""
-		compute the total path the creeps have to go
-		"""
-		wp = [self.start] + self.waypoints + [self.end]
-		path = []
-		for i in range(len(wp) - 1):
-			a = self.grid[wp[i]]
-			b = self.grid[wp[i+1]]
-			path.extend(
-				A_star(
-					a,
-					b,
-					lambda w: cartesian_distance((a.x, a.y),(w.x, w.y)),
-					lambda w1,w2: cartesian_distance((w1.x, w1.y),(w2.x,w2.y)),
-					lambda w: self.get_neighbor(w)
-					)
-				)
-		self.path = path
-		logger.debug('Calculated Path. Length: ' + str(len(self.path)))
-		#print(self.path)
+		board = self.board
+		return [self.grid[board.position(n)] for n in board.free_neighbors(tile.index)]
+
+	def path_changed(self):
+		# the path as tiles
+		super().path_changed()
+		board = self.board
+		self.path = [self.grid[board.position(c)] for c in self.path]
+
+	def adopt(self, shadow):
+		# the tiles follow the cells that changed
+		board = self.board
+		changed = [c for c, v in enumerate(shadow.board.cells) if board.cells[c] != v]
+		super().adopt(shadow)
+		for c in changed:
+			tile = self.grid[board.position(c)]
+			if board.cells[c]:
+				tile.block()
+			else:
+				tile.clear()
 
 	def show_path(self):
 		logger.debug('Showing Path Visualization.')
@@ -379,103 +319,138 @@ class Game(object):
 			if tile.type != BLOCKED:
 				tile.clear()
 
-	def dump_path(self):
-		size = width // tile_multiplier
-		result = []
-		for j in range(size):
-			t = [None for i in range(size)]
-			result.append(t)
-		for (x,y), tile in self.grid.items():
-			result[x][y] = math.inf if tile.type == BLOCKED else 0
-		return result
+	def load_maze(self, path):
+		super().load_maze(path)
+		for tile in self.grid.values():
+			if self.board.cells[tile.index]:
+				tile.block()
+			else:
+				tile.clear()
+		self.show_waypoints()
+		self.show_path()
 
 	def get_tile_for_position(self, pos):
 		return self.grid[(pos[0]//tile_multiplier,pos[1]//tile_multiplier)]
 
-	def update(self):
-		#update the current waves
-		for wave in self.current_waves:
-			wave.update()
-			if not wave.active:
-				logger.debug(str(wave) + ' is no longer active')
-		self.current_waves = [w for w in self.current_waves if w.active]
-
 	def is_valid_grid(self):
 		# returns a tuple with a boolean. If the boolean is false, the 
 		# second item is the tile that is not reachable
-		wp = [self.start] + self.waypoints + [self.end]
-		path = []
-		for i in range(len(wp) - 1):
-			a = self.grid[wp[i]]
-			b = self.grid[wp[i+1]]
-			search = A_star(
-				a,
-				b,
-				lambda w: cartesian_distance((a.x, a.y),(w.x, w.y)),
-				lambda w1,w2: cartesian_distance((w1.x, w1.y),(w2.x,w2.y)),
-				lambda w: self.get_neighbor(w)
-				)
-			if search == False:
-				return (False, self.grid[wp[i+1]])
+		valid, unreachable = super().is_valid_grid()
+		return (valid, None if valid else self.grid[unreachable])
+
+	def block_tile(self, tile):
+		# blocks the tile unless that makes a waypoint unreachable, returns a tuple like
+		# is_valid_grid
+		valid, unreachable = self.block_cell((tile.x, tile.y))
+		if self.recorder:
+			self.recorder.block((tile.x, tile.y))
+		if not valid:
+			return (False, self.grid[unreachable])
+		tile.block()
 		return (True, None)
 
+	def clear_tile(self, tile):
+		tile.clear()
+		self.cell_changed((tile.x, tile.y))
+		if self.recorder:
+			self.recorder.clear((tile.x, tile.y))
+
 	def build_tower_event(self, tile):
 		# if the tile is not already blocked, block it and see if the 
 		# grid is still valid
 		if tile.type != BLOCKED:
-			tile.block()
-		if not self.is_valid_grid():
-			tile.clear()
-			BlinkingTileAnimation(tile)
+			if not self.block_tile(tile)[0]:
+				BlinkingTileAnimation(tile)
 
 
 if __name__ == '__main__':
 
+	parser = argparse.ArgumentParser(description='pyGemTD')
+	parser.add_argument('--record', nargs='?', const=time.strftime('session-%Y%m%d-%H%M%S.gtdr'),
+		help='records the session, to a file named after the current time if none is given')
+	args = parser.parse_args()
+	# only the game itself logs everything, importing this module leaves logging alone
+	logging.basicConfig(level=logging.DEBUG, format='%(asctime)-15s %(funcName)s %(lineno)d %(message)s')
+	# kill -USR1 toggles a cProfile run like the p key
+	instrument.profile_on_signal()
 	display = pygame.display.set_mode((width,height))
 	pygame.display.set_caption('pyGemTowerDefense')
 	
 	#arial_font = pygame.font.SysFont('arial',10)
 
 	game = Game()
+	# with --record, replay.play on the recording runs the session again headless
+	if args.record:
+		game.recorder = replay.Recorder(game, args.record)
 	game.make_path()
 	game.show_waypoints()
 	game.show_path()
+	if game.recorder:
+		game.recorder.make_path()
+	renderer = Renderer(display, game)
+	# searches paths on a worker thread while the frames go on, turned on and off with b
+	worker = pathworker.PathWorker(game)
+	background_paths = False
 
 	print (game.start, game.waypoints, game.end)
 	logger.debug('SPACE calculates path and displays it.')
 	logger.debug('w creates a wave and sends them along the current path.')
+	logger.debug('v sends a vectorized wave of 1000 creeps along the current path.')
 	logger.debug('h hides the current path (still there, just invisible).')
+	logger.debug('f fast-forwards the running waves until they are cleared, drawing every 30th tick.')
 	logger.debug('c resets all blocked tiles and puts path to vanilla.')
-	logger.debug('d dumps a representation of the current grid in console.')
+	logger.debug('d saves the current grid to maze.gtdm, l loads it back.')
+	logger.debug('i starts counting searches and timing frames, pressed again it logs the counts.')
+	logger.debug('p starts profiling, pressed again it writes the profile to pyGemTD.pstats.')
+	logger.debug('b switches to searching paths in the background and back, the frames do not wait for them.')
+	if game.recorder:
+		logger.debug('The session is recorded to %s.', args.record)
 	logger.debug('Creating and activating test wave')
 	c_gen = lambda : Creep(100,2,'NORMAL')
-	wave = Wave(10, c_gen, 60)
-	wave.path = game.path
-	wave.active = True
-	game.current_waves.append(wave)
+	if game.launch_wave(Wave(10, c_gen, 60)) and game.recorder:
+		game.recorder.wave(10, 100, 2, 60)
 
 	terminated = False
 	dragging = False
+	fast_forward_limit = 20000
 	while not terminated:
 		for event in pygame.event.get():
 			if event.type == pygame.QUIT:
 				terminated = True
 			elif event.type == pygame.KEYDOWN:
-				if event.key == pygame.K_SPACE:
+				if event.key == pygame.K_SPACE and background_paths:
+					# shown once the search is done
+					worker.request_path()
+				elif event.key == pygame.K_SPACE:
 					# the path was updated in the gui, make it known
 					game.clear_path()
 					game.make_path()
 					game.show_waypoints()
 					game.show_path()
+					if game.recorder:
+						game.recorder.make_path()
 				elif event.key == pygame.K_w:
 					# starts a new wave with the current path
-					w = Wave(10, c_gen, 60)
-					w.path = game.path
-					w.active = True
-					game.current_waves.append(w)
+					if game.launch_wave(Wave(10, c_gen, 60)) and game.recorder:
+						game.recorder.wave(10, 100, 2, 60)
+				elif event.key == pygame.K_v:
+					# starts a large vectorized wave with the current path
+					if game.launch_wave(VectorWave(1000, 100, 2, 1)) and game.recorder:
+						game.recorder.vector_wave(1000, 100, 2, 1)
+				elif event.key == pygame.K_f:
+					# runs the current waves to their end without waiting for the frame clock, for
+					# at most fast_forward_limit ticks so a wave that never ends can not hang the game
+					sim = simulation.Simulation(game, render_observer(renderer), every=30)
+					for result in sim.run_until_clear(fast_forward_limit):
+						logger.debug('Wave finished: %s', result)
+					if game.current_waves:
+						logger.warning('Stopped fast-forwarding after %s ticks, %s waves are still running.', fast_forward_limit, len(game.current_waves))
 				elif event.key == pygame.K_h:
 					# hides the current path
 					game.hide_path()
+				elif event.key == pygame.K_c and background_paths:
+					# the tiles are cleared together with the new path
+					worker.request_path(reset=True)
 				elif event.key == pygame.K_c:
 					# clear the grid in the sense that it is reset to vanilla
 					for tile in game.grid.values():
@@ -485,12 +460,35 @@ if __name__ == '__main__':
 					game.make_path()
 					game.show_waypoints()
 					game.show_path()
+					if game.recorder:
+						game.recorder.reset()
 				elif event.key == pygame.K_d:
-					# dump the current path to a format that is reusable
-					grid = game.dump_path()
-					logger.debug('START Dumping Grid')
-					logger.debug(grid)
-					logger.debug('END Dumping')
+					# save the current grid in a format that is reusable
+					game.save_maze('maze.gtdm')
+					logger.debug('Saved the grid to maze.gtdm')
+				elif event.key == pygame.K_l:
+					if os.path.exists('maze.gtdm'):
+						worker.cancel()
+						game.clear_path()
+						game.load_maze('maze.gtdm')
+						if game.recorder:
+							game.recorder.load('maze.gtdm')
+						logger.debug('Loaded the grid from maze.gtdm')
+				elif event.key == pygame.K_i:
+					# toggles the counters, logging what was counted when they are turned off
+					if instrument.enabled:
+						instrument.enable(False)
+						logger.debug('Counters:\n%s', instrument.report())
+					else:
+						instrument.reset()
+						instrument.enable()
+				elif event.key == pygame.K_p:
+					instrument.toggle_profile()
+				elif event.key == pygame.K_b:
+					background_paths = not background_paths
+					if not background_paths:
+						worker.cancel()
+					logger.debug('Searching paths in the %s.', 'background' if background_paths else 'frame')
 				elif event.key == pygame.K_t:
 					# we want to build a tower
 					tile = game.get_tile_for_position(pygame.mouse.get_pos())
@@ -501,29 +499,54 @@ if __name__ == '__main__':
 				elif event.button == 3:
 					tile = game.get_tile_for_position(pygame.mouse.get_pos())
 					if tile.type == BLOCKED and tile.type != WAYPOINT:
-						tile.clear()
+						game.clear_tile(tile)
 			elif event.type == pygame.MOUSEBUTTONUP:
 				if event.button == 1:
 					dragging = False
 		if dragging:
 			tile = game.get_tile_for_position(pygame.mouse.get_pos())
 			if tile.type != BLOCKED and tile.type != WAYPOINT:
-				tile.block()
-				# after blocking it, check if it is still a valid grid
-				valid = game.is_valid_grid()
-				if not valid[0]:
-					#clear the tile and display an animation as feedback
-					tile.clear()
-					logger.debug('Blocking tile ' + str(tile) + \
-						' would block access to ' + str(valid[1]))
-					BlinkingTileAnimation(tile)
-		game.update()
-		for b in background:
-			b.draw(display)
-		# this is temporary for testing purpose
-		for w in game.current_waves:
-			w.draw(display)
-		pygame.display.update()
+				if background_paths and game.routes.segments_over((tile.x, tile.y)):
+					# a tile on the path needs a search, the result comes from poll
+					worker.request_block((tile.x, tile.y))
+				else:
+					# only keeps the block if it is still a valid grid
+					valid = game.block_tile(tile)
+					if not valid[0]:
+						#display an animation as feedback
+						logger.debug('Blocking tile %s would block access to %s', tile, valid[1])
+						BlinkingTileAnimation(tile)
+		if background_paths:
+			# the finished searches, adopted by the game all at once between two frames
+			for kind, pos, valid, unreachable in worker.poll():
+				if kind == pathworker.BLOCK:
+					if game.recorder:
+						game.recorder.block(pos)
+					if not valid:
+						logger.debug('Blocking tile %s would block access to %s', game.grid[pos], game.grid[unreachable])
+						BlinkingTileAnimation(game.grid[pos])
+				else:
+					game.clear_path()
+					game.path_changed()
+					game.show_waypoints()
+					game.show_path()
+					if game.recorder and kind == pathworker.RESET:
+						game.recorder.reset()
+					elif game.recorder:
+						game.recorder.make_path()
+		if instrument.enabled:
+			t = instrument.clock()
+			game.update()
+			instrument.add_time('update', instrument.clock() - t)
+			t = instrument.clock()
+			renderer.draw()
+			instrument.add_time('draw', instrument.clock() - t)
+		else:
+			game.update()
+			renderer.draw()
 		clock.tick(60)
 
+	worker.close()
+	if game.recorder:
+		game.recorder.close()
 	pygame.quit()
\ No newline at end of file
@@ -0,0 +1,169 @@
+# recording of game sessions and their headless playback.
+# A recording is a binary log of everything that changes the state of a Game, each stamped with
+# the tick (number of Game.update calls) it happened before:
+#   magic 'GTDR', version
+#   records of tick, operation and the operation's arguments
+#   an END record with the final tick and a checksum of the final state
+# Playing it back applies the same operations at the same ticks to a fresh headless Game and
+# updates it in between as fast as the CPU allows, which ends in the same state.
+import zlib
+import array
+import struct
+import logging
+import simulation
+import vectorwave
+import maze
+logger = logging.getLogger('pyGemTD')
+
+MAGIC = b'GTDR'
+VERSION = 1
+HEADER = struct.Struct('<4sB')
+RECORD = struct.Struct('<IB')
+CELL = struct.Struct('<BB')
+WAVE = struct.Struct('<HHHH')
+LENGTH = struct.Struct('<H')
+CHECKSUM = struct.Struct('<I')
+
+# operations
+BLOCK = 1
+CLEAR = 2
+MAKE_PATH = 3
+RESET = 4
+WAVE_LAUNCH = 5
+VECTOR_WAVE_LAUNCH = 6
+LOAD = 7
+END = 255
+
+def checksum(game):
+	"""
+	a crc of the board, the path and the position of every creep
+	"""
+	crc = zlib.crc32(struct.pack('<I', game.ticks))
+	crc = zlib.crc32(game.board.cells, crc)
+	crc = zlib.crc32(array.array('i', game.routes.path()).tobytes(), crc)
+	for wave in game.current_waves:
+		if hasattr(wave, 'creeps'):
+			for c in wave.creeps:
+				crc = zlib.crc32(struct.pack('<??dd', c.active, c.breached, *(c.pos or (0, 0))), crc)
+		else:
+			crc = zlib.crc32(wave.pos.tobytes(), crc)
+			crc = zlib.crc32(wave.alive.tobytes(), crc)
+	return crc
+
+
+class Recorder(object):
+	"""
+	Writes the operations applied to a game to a recording, call the method of an operation
+	right after doing it. close writes the END record.
+	"""
+
+	def __init__(self, game, path):
+		self.game = game
+		self.file = open(path, 'wb')
+		self.file.write(HEADER.pack(MAGIC, VERSION))
+
+	def record(self, operation, data=b''):
+		self.file.write(RECORD.pack(self.game.ticks, operation) + data)
+
+	def block(self, pos):
+		self.record(BLOCK, CELL.pack(*pos))
+
+	def clear(self, pos):
+		self.record(CLEAR, CELL.pack(*pos))
+
+	def make_path(self):
+		self.record(MAKE_PATH)
+
+	def reset(self):
+		self.record(RESET)
+
+	def wave(self, size, hp, speed, gap):
+		self.record(WAVE_LAUNCH, WAVE.pack(size, hp, speed, gap))
+
+	def vector_wave(self, size, hp, speed, gap):
+		self.record(VECTOR_WAVE_LAUNCH, WAVE.pack(size, hp, speed, gap))
+
+	def load(self, path):
+		# the maze itself goes into the recording, the file may change later
+		with open(path, 'rb') as f:
+			data = f.read()
+		self.record(LOAD, LENGTH.pack(len(data)) + data)
+
+	def close(self):
+		self.record(END, CHECKSUM.pack(checksum(self.game)))
+		self.file.close()
+
+
+def read(path):
+	"""
+	the records of a recording as (tick, operation, arguments) tuples
+	"""
+	with open(path, 'rb') as f:
+		data = f.read()
+	magic, version = HEADER.unpack_from(data)
+	if magic != MAGIC or version != VERSION:
+		raise ValueError(path + ' is not a version ' + str(VERSION) + ' recording')
+	offset = HEADER.size
+	records = []
+	while offset < len(data):
+		tick, operation = RECORD.unpack_from(data, offset)
+		offset += RECORD.size
+		if operation in (BLOCK, CLEAR):
+			arguments = CELL.unpack_from(data, offset)
+			offset += CELL.size
+		elif operation in (WAVE_LAUNCH, VECTOR_WAVE_LAUNCH):
+			arguments = WAVE.unpack_from(data, offset)
+			offset += WAVE.size
+		elif operation == LOAD:
+			length = LENGTH.unpack_from(data, offset)[0]
+			offset += LENGTH.size
+			arguments = (data[offset:offset + length],)
+			offset += length
+		elif operation == END:
+			arguments = CHECKSUM.unpack_from(data, offset)
+			offset += CHECKSUM.size
+		else:
+			arguments = ()
+		records.append((tick, operation, arguments))
+	return records
+
+def apply(game, operation, arguments):
+	# does to a headless game what the game loop did when the operation was recorded
+	if operation == BLOCK:
+		game.block_cell(arguments)
+	elif operation == CLEAR:
+		game.clear_cell(arguments)
+	elif operation == MAKE_PATH:
+		game.make_path()
+		game.free_waypoints()
+	elif operation == RESET:
+		for c in range(len(game.board.cells)):
+			game.board.set(c, 0)
+		game.make_path()
+		game.free_waypoints()
+	elif operation == WAVE_LAUNCH:
+		size, hp, speed, gap = arguments
+		game.launch_wave(simulation.Wave(size, lambda: simulation.Creep(hp, speed, 'NORMAL'), gap))
+	elif operation == VECTOR_WAVE_LAUNCH:
+		game.launch_wave(vectorwave.VectorWave(*arguments))
+	elif operation == LOAD:
+		game.set_maze(*maze.loads(arguments[0]))
+
+def play(path, game=None):
+	"""
+	plays a recording on game (a new headless Game by default), returns the game and whether its
+	final state matches the recorded one (None if the recording has no END)
+	"""
+	if game is None:
+		game = simulation.Game()
+	matches = None
+	for tick, operation, arguments in read(path):
+		while game.ticks < tick:
+			game.update()
+		if operation == END:
+			matches = checksum(game) == arguments[0]
+		else:
+			apply(game, operation, arguments)
+	if matches is False:
+		logger.warning('The final state of %s does not match the recording.', path)
+	return game, matches
@@ -0,0 +1,451 @@
+# the headless part of the game: the board, the route over it and the waves walking it.
+# Nothing in here imports pygame, the rendering lives in pyGemTD.
+import math
+import logging
+import instrument
+import maze
+from pathfinding import SegmentPaths, GridAStar
+from grid import Grid
+from connectivity import CutIndex
+from spatial import CreepIndex
+logger = logging.getLogger('pyGemTD')
+
+# a square screen makes for maximum maze possibilities. 1k might be too much vertically, though
+width = 1000
+height = 1000
+tile_multiplier = 25
+
+def cartesian_distance(one, other):
+	"""
+	geometric line distance between two points
+	"""
+	return math.sqrt((other[0] - one[0])**2 + (other[1] - one[1])**2)
+
+class Wave(object):
+	"""
+	A wave is a group of creeps.
+	A wave is started by the game
+	Assumption: As there is no building/removing of blocks during a wave, the path of all creeps in one
+	wave is the same. 
+	"""
+
+	__slots__ = ('size', 'creep_generator', 'gap', 'gap_ticker', 'creeps', 'active', 'released', 'start', 'fields')
+
+	def __init__(self, size, creep_generator, gap):
+		#the size is the number of creeps in this wave
+		self.size = size
+		#the creep generator is a function without argument that will create creeps for this wave
+		self.creep_generator = creep_generator
+		#the gap is the number of ticks that passes between creeps starting
+		self.gap = gap
+		#the gap_ticker is the counter looping the gap
+		self.gap_ticker = 0
+		#the creeps in ths wave
+		self.creeps = []
+		#a flag indicating if this wave is active, a wave is active when there are still creeps active
+		self.active = False
+		#a flag indicating if this wave is released, a wave is released when all the creeps are on their way
+		self.released = False
+		# the route is not required at creation time (may change since then) but has to be set before creeps
+		# can be sent. It is the start cell and the flow fields leading to the following waypoints, shared by
+		# all creeps in the wave
+		self.start = None
+		self.fields = []
+		logger.debug('Created Wave %s with %s creeps and %s ticks gap.', id(self), self.size, self.gap)
+
+	def update(self):
+		#Assumption: update is only called when the wave is active and has the task to
+		# create creeps until all are there
+		# manage the lifecycle of the creeps
+		# keep the wave flags active/released correct
+		if not self.released:
+			if self.gap_ticker == self.gap:
+				creep = self.creep_generator()
+				creep.fields = self.fields
+				creep.cell = self.start
+				creep.activate()
+				self.creeps.append(creep)
+				self.gap_ticker = 0
+				logger.debug('Wave %s releases creep %s', id(self), creep)
+				if len(self.creeps) == self.size:
+					logger.debug('Wave %s has released all of its creeps.', id(self))
+					self.released = True
+			else:
+				self.gap_ticker += 1
+		# assumption: creeps keep their flags (active, dead, breached) updates themselves
+		for c in [c for c in self.creeps if c.active]:
+			c.update()
+		# recalculate if a creep is now inactive (optimization potential ...)
+		if self.released and len([c for c in self.creeps if c.active]) == 0:
+			#logger.debug('Wave ' + str(id(self)) + ' has no more active creeps.')
+			self.active = False
+
+	def breaches(self):
+		return len([c for c in self.creeps if c.breached])
+
+	def kills(self):
+		return len([c for c in self.creeps if c.dead])
+
+
+class Creep(object):
+	"""
+	A creep walking the flow fields of its wave. The fields are shared by all creeps of the wave,
+	a creep only keeps the cell it walks towards and the field it follows
+	"""
+
+	__slots__ = ('pos', 'hp', 'size', 'currnet_hp', 'speed', 'current_speed', 'type', 'rect', 'active',
+		'breached', 'fields', 'leg', 'cell', 'current_destination', 'dead')
+
+	def __init__(self, hp, speed, creep_type):
+		self.pos = None
+		self.hp = hp
+		# size is the radius of the circle that represents the creep
+		#TODO change creeps to animated sprites
+		self.size = 4
+		self.currnet_hp = self.hp
+		self.speed = speed
+		self.current_speed = self.speed
+		# creep types can either be things like immune/fast/boss/group
+		#TODO decide how flying and potentially other types (spawn) are handled. type or sublcass
+		self.type = creep_type
+		self.rect = None
+		#TODO stun flag/timer, slowed flag/timer/amount
+		# when a creep is active it is on the map and walks
+		self.active = False
+		# when a creep is breached it made it to the end alive
+		self.breached = False
+		# the flow fields leading to each waypoint, the one currently followed and the grid cell
+		# the creep is on or walking towards
+		self.fields = []
+		self.leg = 0
+		self.cell = None
+		#the point currently walking towards
+		self.current_destination = None
+		self.dead = False
+
+	def activate(self):
+		#activating sets the position to the cell the creep starts on, the destination to the next
+		#cell along the flow fields
+		self.active = True
+		self.pos = self.screen_position(self.cell)
+		self.advance()
+		self.current_destination = self.screen_position(self.cell)
+		logger.debug('Creep %s is now active.', self)
+
+	def advance(self):
+		# moves cell one step along the flow fields, it is None after the last waypoint
+		field = self.fields[self.leg]
+		while self.cell == field.target:
+			self.leg += 1
+			if self.leg == len(self.fields):
+				self.cell = None
+				return
+			field = self.fields[self.leg]
+		self.cell = field.step[self.cell]
+
+	def screen_position(self, cell):
+		x, y = self.fields[0].grid.position(cell)
+		return (round(x * tile_multiplier + 0.5 * tile_multiplier), round(y * tile_multiplier + 0.5 * tile_multiplier))
+
+	def die(self):
+		self.dead = True
+		self.active = False
+
+	def breach(self):
+		logger.debug('Creep %s has breached.', self)
+		self.breached = True
+		self.active = False
+
+	def update(self):
+		# update means the creep is active, so it is walking
+		#TODO implement things like stunned and slowed
+		#pos and current_destination are tuples, not objects
+		#the coordinates of the path have to be translated to screen coordinates
+		#logger.debug('Creep Position before update: ' + str(self.pos) + '. Destination ' + str(self.current_destination))
+		#check if we are done with the path, if so, breach
+		if cartesian_distance(self.pos, self.current_destination) <= self.speed:
+			self.advance()
+			if self.cell is None:
+				self.breach()
+				return
+			else:
+				self.current_destination = self.screen_position(self.cell)
+		#now we walk. x first, then y
+		if abs(self.pos[0] - self.current_destination[0]) > self.speed:
+			if self.pos[0] < self.current_destination[0]:
+				#we are walking right
+				self.pos = (self.pos[0] + self.speed, self.pos[1])
+			else:
+				#we are walking left
+				self.pos = (self.pos[0] - self.speed, self.pos[1])
+		else:
+			#as we are active so we are not breached, y it has to be
+			if self.pos[1] < self.current_destination[1]:
+				#we are walking down
+				self.pos = (self.pos[0], self.pos[1] + self.speed)
+			else:
+				#we are walking up
+				self.pos = (self.pos[0], self.pos[1] - self.speed)
+		#logger.debug('Creep Position after update: ' + str(self.pos) + '. Destination ' + str(self.current_destination))
+
+	def __repr__(self):
+		return 'Creep(' + str(id(self)) + ')@' + str(self.pos)
+
+class Game(object):
+
+	def __init__(self):
+		# the compact blocked/free state of the map
+		self.board = Grid(width//tile_multiplier, height//tile_multiplier)
+		# define the waypoints, in relation to the tile_multiplier
+		self.start = (0,125//tile_multiplier)
+		self.waypoints = [(125//tile_multiplier,125//tile_multiplier),(125//tile_multiplier,475//tile_multiplier),\
+		(825//tile_multiplier,475//tile_multiplier),(825//tile_multiplier,125//tile_multiplier),\
+		(475//tile_multiplier,125//tile_multiplier),(475//tile_multiplier,825//tile_multiplier)]
+		self.end = (990//tile_multiplier,800//tile_multiplier)
+		# the cells of the total path, as board indices
+		self.path = []
+		# the waves currently active
+		self.current_waves = []
+		# the number of updates so far
+		self.ticks = 0
+		# the per segment paths along start, waypoints and end, kept current on single cell changes
+		self.routes = SegmentPaths(self.board, [self.start] + self.waypoints + [self.end])
+		# which cells can not be blocked without cutting off a waypoint
+		self.cuts = CutIndex(self.board, [self.start] + self.waypoints + [self.end])
+		# the active creeps by position, rebuilt on the first creep_index call after they moved
+		self.creeps = CreepIndex(tile_multiplier)
+		self.creeps_moved = False
+		# the number of changes to the routes so far, a shadow is only adopted by an unchanged game
+		self.changes = 0
+		# the buffers of is_valid_grid, reused by every check
+		self.search = GridAStar(self.board.width, self.board.height)
+
+	def make_path(self):
+		"""
+		compute the total path the creeps have to go
+		"""
+		self.routes.refresh()
+		self.cuts.invalidate()
+		self.changes += 1
+		self.path_changed()
+
+	def path_changed(self):
+		# the path stops before the first route point that can not be reached
+		self.path = self.routes.path()
+		logger.debug('Calculated Path. Length: %s', len(self.path))
+		unreachable = self.routes.unreachable()
+		if unreachable is not None:
+			logger.warning('The path ends before %s, it can not be reached.', unreachable)
+
+	def dump_path(self):
+		return self.board.to_rows()
+
+	def save_maze(self, path):
+		# the board and the route in the compact maze format
+		maze.save(path, self.board, [self.start] + self.waypoints + [self.end])
+
+	def load_maze(self, path):
+		# replaces the board and the route with a saved maze and computes the path
+		self.set_maze(*maze.load(path))
+
+	def set_maze(self, grid, route):
+		# the areas around the waypoints are freed before the route is searched, once
+		if (grid.width, grid.height) != (self.board.width, self.board.height):
+			raise ValueError('a ' + str(grid.width) + 'x' + str(grid.height) + ' maze does not fit the board')
+		for c, v in enumerate(grid.cells):
+			self.board.set(c, v)
+		self.start, self.waypoints, self.end = route[0], route[1:-1], route[-1]
+		self.free_waypoints()
+		self.routes = SegmentPaths(self.board, route)
+		self.cuts = CutIndex(self.board, route)
+		self.changes += 1
+		self.path_changed()
+
+	def waypoint_area(self):
+		# the 4x4 cells around every waypoint, they are kept free
+		for point in self.waypoints:
+			for x in range(4):
+				for y in range(4):
+					yield (point[0]-1+x, point[1]-1+y)
+
+	def free_waypoints(self):
+		for pos in self.waypoint_area():
+			self.board.clear(pos)
+
+	def launch_wave(self, wave):
+		# sends the wave along the current route, returns False without launching it when the
+		# route is broken, the creeps could never get to the end
+		if not self.routes.is_valid():
+			logger.warning('Not launching %s, %s can not be reached.', wave, self.routes.unreachable())
+			return False
+		wave.start = self.board.index(self.start)
+		wave.fields = self.routes.fields[:]
+		wave.active = True
+		self.current_waves.append(wave)
+		self.creeps_moved = True
+		return True
+
+	def update(self):
+		#update the current waves
+		self.ticks += 1
+		for wave in self.current_waves:
+			wave.update()
+			if not wave.active:
+				logger.debug('%s is no longer active', wave)
+		self.current_waves = [w for w in self.current_waves if w.active]
+		self.creeps_moved = True
+
+	def creep_index(self):
+		"""
+		the spatial index of the active creeps, for range, nearest and furthest creep queries
+		"""
+		if self.creeps_moved:
+			self.creeps.rebuild(self.current_waves)
+			self.creeps_moved = False
+		return self.creeps
+
+	def is_valid_grid(self):
+		# returns a tuple with a boolean. If the boolean is false, the 
+		# second item is the position that is not reachable
+		# the whole route is searched in one pass, the routes and the cut index stay as they are
+		if instrument.enabled:
+			instrument.count('validity_checks')
+		board = self.board
+		points = [board.index(p) for p in [self.start] + self.waypoints + [self.end]]
+		path, lengths, unreachable = self.search.route(points, board.cells, 'bidirectional')
+		if unreachable is not None:
+			return (False, board.position(unreachable))
+		return (True, None)
+
+	def cell_changed(self, pos):
+		# keeps the route and the cut index current after the cell at pos was blocked or cleared
+		self.routes.cell_changed(pos)
+		self.cuts.cell_changed(pos)
+		self.changes += 1
+
+	def block_cell(self, pos):
+		# blocks the cell unless that makes a waypoint unreachable, returns a tuple like
+		# is_valid_grid. Cells off the current path are always fine. For cells on it the cut
+		# index answers if it can without a build, otherwise the block is searched and undone
+		# if it cut the route. A build costs a search over every free cell, more than
+		# searching the segments the cell is on
+		if instrument.enabled:
+			instrument.count('validity_checks')
+		segments = self.routes.segments_over(pos)
+		if segments and self.cuts.knows(pos, segments):
+			cut = self.cuts.blocks_route(pos, segments)
+			if cut:
+				return (False, self.cuts.unreachable(cut))
+		self.board.block(pos)
+		self.cell_changed(pos)
+		unreachable = self.routes.unreachable()
+		if unreachable is not None:
+			# blocking cut the route (or it was cut before), undone without a search
+			self.clear_cell(pos)
+			return (False, unreachable)
+		return (True, None)
+
+	def clear_cell(self, pos):
+		self.board.clear(pos)
+		self.cell_changed(pos)
+
+	def shadow(self):
+		"""
+		a headless Game with copies of the board, the routes and the cut index and no waves, to
+		search paths on another thread while this game goes on. See adopt.
+		"""
+		# __init__ would search all the routes again
+		shadow = Game.__new__(Game)
+		shadow.board = self.board.copy()
+		shadow.start, shadow.waypoints, shadow.end = self.start, self.waypoints[:], self.end
+		shadow.path = []
+		shadow.current_waves = []
+		shadow.ticks = self.ticks
+		shadow.routes = self.routes.copy(shadow.board)
+		shadow.cuts = self.cuts.copy(shadow.board)
+		shadow.creeps = CreepIndex(tile_multiplier)
+		shadow.creeps_moved = False
+		shadow.changes = self.changes
+		# searches on the other thread need their own buffers
+		shadow.search = GridAStar(shadow.board.width, shadow.board.height)
+		return shadow
+
+	def adopt(self, shadow):
+		"""
+		takes over the board, the routes and the cut index of a shadow, as if what was done to the
+		shadow had been done to this game. Only valid as long as neither the board nor the routes
+		changed since the shadow was made. The path is left alone, see path_changed.
+		"""
+		board = self.board
+		for c, v in enumerate(shadow.board.cells):
+			if board.cells[c] != v:
+				board.set(c, v)
+		self.routes = shadow.routes
+		self.routes.grid = board
+		self.cuts = shadow.cuts
+		self.cuts.grid = board
+		self.changes += 1
+
+
+class Simulation(object):
+	"""
+	Steps a Game at its fixed timestep as fast as the CPU allows, nothing is drawn.
+	observer: optional function called with (game, tick) every `every` ticks, e.g. to render
+	Every wave that finishes is summed up in results as a dict with its size, breaches, kills
+	and the ticks it took from launch to clear.
+	"""
+
+	def __init__(self, game, observer=None, every=1):
+		self.game = game
+		self.observer = observer
+		self.every = every
+		self.tick = 0
+		# id of every running wave -> (wave, tick it was first seen)
+		self.running = {}
+		self.results = []
+
+	def step(self):
+		game = self.game
+		for wave in game.current_waves:
+			if id(wave) not in self.running:
+				self.running[id(wave)] = (wave, self.tick)
+		waves = game.current_waves
+		if instrument.enabled:
+			t = instrument.clock()
+			game.update()
+			instrument.add_time('tick', instrument.clock() - t)
+		else:
+			game.update()
+		self.tick += 1
+		for wave in waves:
+			if not wave.active:
+				started = self.running.pop(id(wave))[1]
+				self.results.append({
+					'size': wave.size,
+					'breaches': wave.breaches(),
+					'kills': wave.kills(),
+					'ticks': self.tick - started,
+					})
+		if self.observer is not None and self.tick % self.every == 0:
+			self.observer(game, self.tick)
+
+	def run(self, ticks):
+		"""
+		advances ticks ticks, returns the summaries of the waves that finished meanwhile
+		"""
+		finished = len(self.results)
+		for t in range(ticks):
+			self.step()
+		return self.results[finished:]
+
+	def run_until_clear(self, limit=None):
+		"""
+		advances until no wave is running (or limit ticks passed), returns the summaries of the
+		waves that finished meanwhile
+		"""
+		finished = len(self.results)
+		ticks = 0
+		while self.game.current_waves and (limit is None or ticks < limit):
+			self.step()
+			ticks += 1
+		return self.results[finished:]
@@ -0,0 +1,141 @@
+import math
+import numpy as np
+
+class CreepIndex(object):
+	"""
+	The active creeps of all waves sorted into square buckets of cell_size pixels, keyed by
+	their bucket column and row. A range query only looks at the buckets the circle touches.
+	Every entry is (x, y, remaining, creep): the screen position, the number of steps left to
+	the end of the route from the cell the creep walks towards, and the creep. Creeps of a
+	VectorWave are (wave, i) pairs.
+	"""
+
+	def __init__(self, cell_size):
+		self.cell_size = cell_size
+		self.buckets = {}
+		self.count = 0
+		# the range of occupied bucket columns and rows
+		self.low = (0, 0)
+		self.high = (-1, -1)
+
+	def clear(self):
+		self.buckets.clear()
+		self.count = 0
+		self.low = (0, 0)
+		self.high = (-1, -1)
+
+	def insert(self, creep, pos, remaining):
+		size = self.cell_size
+		key = (int(pos[0] // size), int(pos[1] // size))
+		bucket = self.buckets.get(key)
+		if bucket is None:
+			self.buckets[key] = [(pos[0], pos[1], remaining, creep)]
+		else:
+			bucket.append((pos[0], pos[1], remaining, creep))
+		if self.count == 0:
+			self.low = self.high = key
+		else:
+			self.low = (min(self.low[0], key[0]), min(self.low[1], key[1]))
+			self.high = (max(self.high[0], key[0]), max(self.high[1], key[1]))
+		self.count += 1
+
+	def rebuild(self, waves):
+		"""
+		indexes the active creeps of waves, forgetting everything indexed before
+		"""
+		self.clear()
+		for wave in waves:
+			if hasattr(wave, 'creeps'):
+				self.insert_wave(wave)
+			else:
+				self.insert_vector_wave(wave)
+
+	def insert_wave(self, wave):
+		fields = wave.fields
+		if not fields:
+			return
+		# after[k] is the number of steps of all legs after leg k
+		after = [0] * len(fields)
+		for k in range(len(fields) - 2, -1, -1):
+			after[k] = after[k+1] + fields[k+1].distance[fields[k].target]
+		for c in wave.creeps:
+			if c.active:
+				self.insert(c, c.pos, fields[c.leg].distance[c.cell] + after[c.leg])
+
+	def insert_vector_wave(self, wave):
+		if wave.path is None:
+			return
+		last = len(wave.path) - 1
+		walking = np.flatnonzero(wave.alive)
+		for i, (x, y), target in zip(walking.tolist(), wave.pos[walking].tolist(), wave.target[walking].tolist()):
+			self.insert((wave, i), (x, y), last - target)
+
+	def entries_within(self, pos, radius):
+		size = self.cell_size
+		x, y = pos
+		r2 = radius * radius
+		result = []
+		buckets = self.buckets
+		for bx in range(max(self.low[0], int((x - radius) // size)), min(self.high[0], int((x + radius) // size)) + 1):
+			for by in range(max(self.low[1], int((y - radius) // size)), min(self.high[1], int((y + radius) // size)) + 1):
+				bucket = buckets.get((bx, by))
+				if bucket:
+					for entry in bucket:
+						dx = entry[0] - x
+						dy = entry[1] - y
+						if dx * dx + dy * dy <= r2:
+							result.append(entry)
+		return result
+
+	def within(self, pos, radius):
+		"""
+		the creeps at most radius pixels away from pos
+		"""
+		return [entry[3] for entry in self.entries_within(pos, radius)]
+
+	def nearest(self, pos, radius=math.inf):
+		"""
+		the creep closest to pos, None if there is none within radius. The buckets are searched in
+		growing rings around the one of pos until no closer creep can be left
+		"""
+		if not self.count:
+			return None
+		size = self.cell_size
+		x, y = pos
+		cx, cy = int(x // size), int(y // size)
+		# beyond this ring there are no buckets with creeps
+		last = max(abs(cx - self.low[0]), abs(cx - self.high[0]), abs(cy - self.low[1]), abs(cy - self.high[1]))
+		best = None
+		best_d2 = radius * radius
+		buckets = self.buckets
+		for ring in range(last + 1):
+			# every creep in this ring or further out is at least (ring - 1) * size pixels away
+			near = max(ring - 1, 0) * size
+			if near > radius or (best is not None and best_d2 <= near * near):
+				break
+			for bx in range(cx - ring, cx + ring + 1):
+				# the outer columns of the ring are whole, in between only the top and bottom row
+				step = 1 if abs(bx - cx) == ring else 2 * ring
+				for by in range(cy - ring, cy + ring + 1, step):
+					bucket = buckets.get((bx, by))
+					if bucket:
+						for entry in bucket:
+							dx = entry[0] - x
+							dy = entry[1] - y
+							d2 = dx * dx + dy * dy
+							if d2 <= best_d2:
+								best, best_d2 = entry[3], d2
+		return best
+
+	def furthest(self, pos, radius):
+		"""
+		of the creeps within radius of pos the one with the fewest steps left to the end, None if
+		there is none
+		"""
+		entries = self.entries_within(pos, radius)
+		if not entries:
+			return None
+		return min(entries, key=lambda entry: entry[2])[3]
+
+	def __len__(self):
+		return self.count
@@ -0,0 +1,58 @@
+# randomized cross-checks of the incremental cut index against building it from scratch.
+# Run with python -m unittest test_connectivity
+import random
+import unittest
+from grid import Grid
+from connectivity import CutIndex
+from test_paths import SIZE, ROUTE, random_grid
+
+def fresh_cuts(grid, pos):
+	return CutIndex(grid, ROUTE).blocks_route(pos)
+
+
+class TestCutIndex(unittest.TestCase):
+
+	def test_incremental_matches_fresh(self):
+		rnd = random.Random(2)
+		for trial in range(20):
+			grid = random_grid(rnd, 0.25)
+			cuts = CutIndex(grid, ROUTE)
+			for k in range(40):
+				pos = (rnd.randrange(SIZE), rnd.randrange(SIZE))
+				grid.flip(pos)
+				cuts.cell_changed(pos)
+				# asking builds segments in between changes, so undos follow builds too
+				for j in range(3):
+					probe = (rnd.randrange(SIZE), rnd.randrange(SIZE))
+					if not grid.is_blocked(probe):
+						self.assertEqual(cuts.blocks_route(probe), fresh_cuts(grid, probe))
+				if rnd.random() < 0.3:
+					grid.flip(pos)
+					cuts.cell_changed(pos)
+
+	def test_undo_after_build(self):
+		# a wall with two gaps, blocking both cuts the segment
+		grid = Grid(SIZE, SIZE)
+		for y in range(SIZE):
+			if y not in (2, 9):
+				grid.block((6, y))
+		cuts = CutIndex(grid, ROUTE)
+		for s in range(cuts.segments):
+			cuts.build(s)
+		a, b = (6, 2), (6, 9)
+		grid.block(a)
+		cuts.cell_changed(a)
+		self.assertTrue(cuts.blocks_route(b))
+		grid.clear(a)
+		cuts.cell_changed(a)
+		self.assertEqual(cuts.blocks_route(b), fresh_cuts(grid, b))
+
+	def test_blocked_start(self):
+		grid = Grid(SIZE, SIZE)
+		grid.block(ROUTE[0])
+		cuts = CutIndex(grid, ROUTE)
+		self.assertEqual(cuts.blocks_route((5, 5)) & 1, 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
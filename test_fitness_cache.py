@@ -0,0 +1,77 @@
+# the fitness cache must not change what the GA does, only how often it searches.
+# Run with python -m unittest test_fitness_cache
+import random
+import logging
+import unittest
+from pathfinding import SegmentPaths
+from geneticAlgo import Individual, FitnessCache
+
+def climb(cache_size, seed):
+	# a few individuals gradient flipped, every grid and fitness along the way
+	cache = Individual.cache
+	Individual.cache = FitnessCache(cache_size)
+	flip = Individual.flip
+	seen = []
+	def traced(self, x, y):
+		flip(self, x, y)
+		seen.append((bytes(self.grid.cells), self.fitness, self.is_valid))
+	Individual.flip = traced
+	try:
+		random.seed(seed)
+		for k in range(2):
+			i = Individual()
+			i.randomize()
+			for t in range(5):
+				i.gradient_flip(100)
+			# the same grids again start from cached fitnesses
+			i.calculate_fitness()
+			i.gradient_flip(100)
+	finally:
+		Individual.flip = flip
+		Individual.cache = cache
+	return seen
+
+class TestFitnessCache(unittest.TestCase):
+
+	def setUp(self):
+		logging.disable(logging.CRITICAL)
+
+	def tearDown(self):
+		logging.disable(logging.NOTSET)
+
+	def test_same_climb_with_and_without_cache(self):
+		self.assertEqual(climb(100000, 5), climb(0, 5))
+
+	def test_flips_between_cached_grids(self):
+		# every grid on the way is cached, so the paths fall behind the grid and catch up later
+		cache = Individual.cache
+		Individual.cache = FitnessCache(100000)
+		try:
+			random.seed(7)
+			i = Individual()
+			i.randomize()
+			blocked = [i.grid.position(c) for c, v in enumerate(i.grid.cells) if v]
+			for t in range(40):
+				a, b = random.sample(blocked, 2)
+				for j in (i.clone(), i.clone()):
+					for pos in (a, a, b, b, a, b, b, a):
+						j.flip(*pos)
+						routes = SegmentPaths(j.grid.copy(), Individual.waypoints)
+						self.assertEqual(j.is_valid, routes.is_valid())
+						if j.is_valid:
+							self.assertEqual(j.fitness, routes.length())
+		finally:
+			Individual.cache = cache
+
+	def test_fitness_matches_fresh_search(self):
+		for cells, fitness, is_valid in climb(100000, 6)[::25]:
+			i = Individual()
+			i.grid.cells[:] = cells
+			routes = SegmentPaths(i.grid, Individual.waypoints)
+			self.assertEqual(is_valid, routes.is_valid())
+			if is_valid:
+				self.assertEqual(fitness, routes.length())
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,62 @@
+# the GridAStar modes and whole route searches cross-checked against FlowField searches.
+# Run with python -m unittest test_gridastar
+import random
+import unittest
+from grid import Grid
+from pathfinding import GridAStar, SegmentPaths
+from test_paths import SIZE, ROUTE, random_grid, fresh_length
+
+
+class TestGridAStar(unittest.TestCase):
+
+	def check_path(self, grid, path, start, goal):
+		self.assertEqual((path[0], path[-1]), (start, goal))
+		for c, n in zip(path, path[1:]):
+			self.assertIn(n, grid.neighbors[c])
+		self.assertFalse(any(grid.cells[c] for c in path))
+
+	def test_modes_match_fresh(self):
+		rnd = random.Random(3)
+		search = GridAStar(SIZE, SIZE)
+		for trial in range(40):
+			grid = random_grid(rnd)
+			for k in range(10):
+				start = rnd.randrange(SIZE * SIZE)
+				goal = rnd.randrange(SIZE * SIZE)
+				expected = fresh_length(grid, start, goal) if not grid.cells[start] else 0
+				for mode in GridAStar.modes:
+					path = search.search(start, goal, grid.cells, mode)
+					self.assertEqual(len(path) if path else 0, expected, mode)
+					if path:
+						self.check_path(grid, path, start, goal)
+
+	def test_route_matches_segment_paths(self):
+		rnd = random.Random(4)
+		search = GridAStar(SIZE, SIZE)
+		for trial in range(20):
+			grid = random_grid(rnd)
+			if rnd.random() < 0.3:
+				grid.block(rnd.choice(ROUTE))
+			routes = SegmentPaths(grid, ROUTE)
+			points = [grid.index(p) for p in ROUTE]
+			for mode in GridAStar.modes:
+				path, lengths, unreachable = search.route(points, grid.cells, mode)
+				# both stop at the first segment without a path
+				expected = routes.lengths()
+				if 0 in expected:
+					expected = expected[:expected.index(0)] + [0] * (len(expected) - expected.index(0))
+				self.assertEqual(lengths, expected, mode)
+				position = routes.unreachable()
+				self.assertEqual(unreachable, None if position is None else grid.index(position), mode)
+				self.assertEqual(len(path), sum(lengths))
+
+	def test_blocked_goal(self):
+		grid = Grid(5, 5)
+		grid.block((4, 4))
+		search = GridAStar(5, 5)
+		for mode in GridAStar.modes:
+			self.assertEqual(search.route([0, 24], grid.cells, mode), ([], [0], 24))
+
+
+if __name__ == '__main__':
+	unittest.main()
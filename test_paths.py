@@ -0,0 +1,53 @@
+# randomized cross-checks of the incremental SegmentPaths against searching from scratch with a
+# FlowField, the random grids are shared with the other tests. Run with python -m unittest test_paths
+import random
+import unittest
+from grid import Grid
+from flowfield import FlowField
+from pathfinding import SegmentPaths
+
+SIZE = 12
+ROUTE = [(0, 0), (11, 3), (2, 10), (11, 11)]
+
+def random_grid(rnd, blocked=0.3):
+	grid = Grid(SIZE, SIZE, bytes(1 if rnd.random() < blocked else 0 for c in range(SIZE * SIZE)))
+	for p in ROUTE:
+		grid.clear(p)
+	return grid
+
+def fresh_length(grid, start, goal):
+	# the number of cells of the shortest path, 0 if there is none
+	return FlowField(grid, goal).distance[start] + 1
+
+
+class TestSegmentPaths(unittest.TestCase):
+
+	def check(self, routes, grid):
+		points = [grid.index(p) for p in ROUTE]
+		expected = [fresh_length(grid, points[s], points[s+1]) for s in range(len(points) - 1)]
+		self.assertEqual(routes.lengths(), expected)
+		self.assertEqual(routes.is_valid(), all(expected))
+		for s, path in enumerate(routes.paths):
+			if path:
+				self.assertEqual((path[0], path[-1]), (points[s], points[s+1]))
+				self.assertFalse(any(grid.cells[c] for c in path))
+
+	def test_incremental_matches_fresh(self):
+		rnd = random.Random(1)
+		for trial in range(20):
+			grid = random_grid(rnd)
+			routes = SegmentPaths(grid, ROUTE)
+			for k in range(60):
+				pos = (rnd.randrange(SIZE), rnd.randrange(SIZE))
+				grid.flip(pos)
+				routes.cell_changed(pos)
+				self.check(routes, grid)
+				if rnd.random() < 0.3:
+					# undoing the change right away
+					grid.flip(pos)
+					routes.cell_changed(pos)
+					self.check(routes, grid)
+
+
+if __name__ == '__main__':
+	unittest.main()
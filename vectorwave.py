@@ -0,0 +1,122 @@
+import numpy as np
+import logging
+from simulation import tile_multiplier
+logger = logging.getLogger('pyGemTD')
+
+class VectorWave(object):
+	"""
+	A wave of identical creeps moved all at once.
+	Instead of one Creep object per creep, positions, speeds, hp, the index of the path point
+	walked towards and the active/breached flags are kept in NumPy arrays, and all creeps index
+	into the one path array of the wave. A tick is a handful of array operations no matter how
+	many creeps there are, and creeps walk exactly like Creep.update does.
+	Plays the part of a Wave for Game.launch_wave and Game.update.
+	"""
+
+	def __init__(self, size, hp, speed, gap):
+		#the size is the number of creeps in this wave
+		self.size = size
+		#the gap is the number of ticks that passes between creeps starting
+		self.gap = gap
+		#the gap_ticker is the counter looping the gap
+		self.gap_ticker = 0
+		#the number of creeps released so far
+		self.released_count = 0
+		self.active = False
+		self.released = False
+		# set by Game.launch_wave, the screen coordinates of the route are built from them
+		# on the first update
+		self.start = None
+		self.fields = []
+		self.path = None
+		self.pos = np.zeros((size, 2))
+		self.speed = np.full(size, float(speed))
+		self.hp = np.full(size, float(hp))
+		# index into path of the point each creep walks towards
+		self.target = np.zeros(size, dtype=np.intp)
+		self.alive = np.zeros(size, dtype=bool)
+		self.breached = np.zeros(size, dtype=bool)
+		self.dead = np.zeros(size, dtype=bool)
+		logger.debug('Created VectorWave %s with %s creeps and %s ticks gap.', id(self), size, gap)
+
+	def build_path(self):
+		# follows the flow fields from start, the screen coordinates of every cell on the way
+		grid = self.fields[0].grid
+		cells = [self.start]
+		for field in self.fields:
+			c = cells[-1]
+			if field.distance[c] < 0:
+				raise ValueError('the route is broken, ' + str(grid.position(field.target)) + ' can not be reached')
+			while c != field.target:
+				c = field.step[c]
+				cells.append(c)
+		xy = np.array([grid.position(c) for c in cells], dtype=float)
+		self.path = np.round(xy * tile_multiplier + 0.5 * tile_multiplier)
+
+	def release(self):
+		i = self.released_count
+		self.pos[i] = self.path[0]
+		self.target[i] = 1
+		self.alive[i] = True
+		self.released_count += 1
+		if self.released_count == self.size:
+			logger.debug('VectorWave %s has released all of its creeps.', id(self))
+			self.released = True
+
+	def update(self):
+		if self.path is None:
+			self.build_path()
+		if not self.released:
+			if self.gap_ticker == self.gap:
+				self.release()
+				self.gap_ticker = 0
+			else:
+				self.gap_ticker += 1
+		walking = np.flatnonzero(self.alive)
+		if len(walking):
+			self.walk(walking)
+		if self.released and not self.alive.any():
+			self.active = False
+
+	def walk(self, i):
+		path = self.path
+		pos = self.pos[i]
+		speed = self.speed[i]
+		target = self.target[i]
+		destination = path[target]
+		# creeps at their destination head for the next path point, or breach after the last
+		reached = np.hypot(*(destination - pos).T) <= speed
+		target = target + reached
+		done = target == len(path)
+		if done.any():
+			self.alive[i[done]] = False
+			self.breached[i[done]] = True
+			keep = ~done
+			i, pos, speed, target = i[keep], pos[keep], speed[keep], target[keep]
+		destination = path[target]
+		# now we walk. x first, then y
+		dx = destination[:, 0] - pos[:, 0]
+		along_x = np.abs(dx) > speed
+		step_x = np.where(dx > 0, speed, -speed)
+		step_y = np.where(pos[:, 1] < destination[:, 1], speed, -speed)
+		pos[:, 0] += np.where(along_x, step_x, 0)
+		pos[:, 1] += np.where(along_x, 0, step_y)
+		self.pos[i] = pos
+		self.target[i] = target
+
+	def die(self, i):
+		# i: index or index array of the creeps that died
+		self.dead[i] = True
+		self.alive[i] = False
+
+	def breaches(self):
+		return int(self.breached.sum())
+
+	def kills(self):
+		return int(self.dead.sum())
+
+	def positions(self):
+		"""
+		the screen coordinates of the creeps currently walking
+		"""
+		return self.pos[self.alive]